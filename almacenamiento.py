@@ -0,0 +1,240 @@
+# almacenamiento.py
+"""
+Lectura de la encuesta cruda y lectura/escritura del archivo intermedio
+(Encuesta_limpia) que comparten limpieza, nse, hipotesis_1 e hipotesis_2.
+
+El formato se deduce de la extensión de la ruta:
+- .csv      → como siempre (texto, se parsea completo).
+- .parquet  → columnar; las columnas de texto se guardan como categóricas
+- .feather     (dictionary encoding) y se pueden leer solo las columnas necesarias.
+
+Parquet/Feather requieren pyarrow (dependencia opcional). La ruta por defecto se
+puede cambiar con la variable de entorno ENCUESTA_LIMPIA, p. ej.
+ENCUESTA_LIMPIA=Encuesta_limpia.parquet.
+
+El intermedio se lee con los tipos de esquema.py (categóricas, Int8, float32)
+en cualquier formato; con tipar=False, como texto y números sueltos. Se escribe
+siempre a un temporal que después reemplaza al archivo (archivos.escritura_atomica):
+quien lo lee o lo hashea en paralelo nunca ve un archivo a medio escribir.
+"""
+
+import os
+
+import pandas as pd
+
+from archivos import escritura_atomica
+from esquema import aplicar_esquema, tipos_lectura, tipos_por_columna
+from instrumentacion import medir
+
+ENCUESTA_CRUDA = "Encuesta.csv"
+ENCUESTA_LIMPIA = os.environ.get("ENCUESTA_LIMPIA", "Encuesta_limpia.csv")
+
+FORMATOS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".feather": "feather",
+}
+
+
+def formato_de(ruta: str) -> str:
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in FORMATOS:
+        raise ValueError(f"Formato no soportado para '{ruta}' (usar {', '.join(FORMATOS)})")
+    return FORMATOS[extension]
+
+
+def _requerir_pyarrow(formato: str):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as error:
+        raise ImportError(f"El formato '{formato}' requiere pyarrow (pip install pyarrow)") from error
+
+
+def _es_texto(serie: pd.Series) -> bool:
+    return serie.dtype == object or isinstance(serie.dtype, pd.StringDtype)
+
+
+def _decodificar_categoricas(df: pd.DataFrame, excepto=()) -> pd.DataFrame:
+    # Las categóricas de Parquet/Feather vuelven como texto, igual que desde CSV
+    for col in df.columns:
+        if col not in excepto and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
+
+def _tipar(df: pd.DataFrame, tipar: bool) -> pd.DataFrame:
+    # Con `tipar`, los tipos de esquema.py; el resto de las categóricas, a texto
+    if not tipar:
+        return _decodificar_categoricas(df)
+    return _decodificar_categoricas(aplicar_esquema(df), excepto=tipos_por_columna(df.columns))
+
+
+def _tipos_csv(ruta: str, columnas, tipar: bool, texto: bool) -> dict:
+    # dtype de read_csv: categóricas del esquema directo como "category"; con
+    # `texto`, todo lo demás como str (así el tipo no depende del bloque)
+    nombres = columnas if columnas is not None else leer_encabezado(ruta)
+    tipos = {col: str for col in nombres} if texto else {}
+    if tipar:
+        tipos.update(tipos_lectura(nombres))
+    return tipos
+
+
+def leer_encuesta_cruda(ruta: str = ENCUESTA_CRUDA, tamano_bloque: int = None, columnas=None):
+    """
+    Lee la encuesta cruda (todas las columnas o solo `columnas`) como texto,
+    para que los tipos no dependan de qué filas se leen juntas (mismo resultado
+    completa o por bloques). Con `tamano_bloque` devuelve un iterador de DataFrames.
+    """
+    columnas = list(columnas) if columnas is not None else None
+    return pd.read_csv(ruta, usecols=columnas, dtype=str, chunksize=tamano_bloque)
+
+
+def guardar_intermedio(df: pd.DataFrame, ruta: str = ENCUESTA_LIMPIA):
+    """Escribe `df` en `ruta` según su extensión (texto → categórica en Parquet/Feather)."""
+    formato = formato_de(ruta)
+    with escritura_atomica(ruta) as temporal, medir("almacenamiento.guardar", filas_salida=len(df), formato=formato):
+        if formato == "csv":
+            df.to_csv(temporal, index=False)
+            return
+
+        _requerir_pyarrow(formato)
+        categoricas = df.astype({col: "category" for col in df.columns if _es_texto(df[col])})
+        if formato == "parquet":
+            categoricas.to_parquet(temporal, index=False)
+        else:
+            categoricas.reset_index(drop=True).to_feather(temporal)
+
+
+def _esquema_arrow(tabla, formato: str):
+    # Parquet: índices de diccionario a int32, porque el ancho que elige pandas
+    # (int8/int16) depende de cuántas categorías trae cada bloque.
+    # Feather: un archivo IPC admite un solo diccionario por columna y cada
+    # bloque trae el suyo, así que por bloques se escribe texto plano.
+    import pyarrow as pa
+
+    campos = []
+    for campo in tabla.schema:
+        if pa.types.is_dictionary(campo.type):
+            if formato == "parquet":
+                campo = campo.with_type(pa.dictionary(pa.int32(), campo.type.value_type))
+            else:
+                campo = campo.with_type(campo.type.value_type)
+        campos.append(campo)
+    return pa.schema(campos, metadata=tabla.schema.metadata)
+
+
+def guardar_intermedio_por_bloques(bloques, ruta: str = ENCUESTA_LIMPIA) -> int:
+    """
+    Escribe en `ruta` una secuencia de DataFrames con las mismas columnas, uno
+    detrás del otro, sin juntarlos en memoria. En CSV el resultado es idéntico
+    a `guardar_intermedio` del DataFrame concatenado. Devuelve las filas escritas.
+    `ruta` se reemplaza al terminar, así que puede ser el mismo archivo del que
+    salen los `bloques`.
+    """
+    with escritura_atomica(ruta) as temporal:
+        return _escribir_bloques(bloques, temporal, formato_de(ruta))
+
+
+def _escribir_bloques(bloques, ruta: str, formato: str) -> int:
+    filas = 0
+    if formato == "csv":
+        for i, bloque in enumerate(bloques):
+            bloque.to_csv(ruta, index=False, mode="w" if i == 0 else "a", header=(i == 0))
+            filas += len(bloque)
+        return filas
+
+    _requerir_pyarrow(formato)
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    escritor, esquema = None, None
+    try:
+        for bloque in bloques:
+            categoricas = bloque.astype({col: "category" for col in bloque.columns if _es_texto(bloque[col])})
+            tabla = pa.Table.from_pandas(categoricas, preserve_index=False)
+            if escritor is None:
+                esquema = _esquema_arrow(tabla, formato)
+                escritor = pq.ParquetWriter(ruta, esquema) if formato == "parquet" else ipc.new_file(ruta, esquema)
+            escritor.write_table(tabla.cast(esquema))
+            filas += len(bloque)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
+
+
+def leer_encabezado(ruta: str = ENCUESTA_LIMPIA) -> tuple:
+    """Nombres de columnas de `ruta` sin leer los datos (primera línea o esquema Arrow)."""
+    formato = formato_de(ruta)
+    if formato == "csv":
+        return tuple(pd.read_csv(ruta, nrows=0).columns)
+
+    _requerir_pyarrow(formato)
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        return tuple(pq.read_schema(ruta).names)
+
+    import pyarrow.ipc as ipc
+    with ipc.open_file(ruta) as lector:
+        return tuple(lector.schema.names)
+
+
+def leer_intermedio(ruta: str = ENCUESTA_LIMPIA, columnas=None, tipar: bool = True) -> pd.DataFrame:
+    """
+    Lee `ruta` (todas las columnas o solo `columnas`) con los tipos de
+    esquema.py. Con `tipar` False las columnas quedan como las deja read_csv
+    (las categóricas de Parquet/Feather se devuelven como texto).
+    """
+    formato = formato_de(ruta)
+    columnas = list(columnas) if columnas is not None else None
+    with medir("almacenamiento.leer", formato=formato) as medida:
+        if formato == "csv":
+            df = pd.read_csv(ruta, usecols=columnas, dtype=_tipos_csv(ruta, columnas, tipar, texto=False))
+        else:
+            _requerir_pyarrow(formato)
+            if formato == "parquet":
+                df = pd.read_parquet(ruta, columns=columnas)
+            else:
+                df = pd.read_feather(ruta, columns=columnas)
+        df = _tipar(df, tipar)
+        medida["filas_salida"] = len(df)
+    return df
+
+
+def leer_intermedio_por_bloques(ruta: str = ENCUESTA_LIMPIA, tamano_bloque: int = 100_000, columnas=None,
+                                tipar: bool = True):
+    """
+    Itera `ruta` de a `tamano_bloque` filas (todas las columnas o solo `columnas`),
+    con los tipos de esquema.py como leer_intermedio. En CSV las columnas sin
+    tipo declarado se leen como texto, para que el tipo de cada columna no
+    dependa de qué filas caen en el bloque; en Parquet/Feather se conserva el
+    tipo guardado. Con `tipar` False, CSV todo texto y las categóricas de
+    Parquet/Feather como texto.
+    """
+    formato = formato_de(ruta)
+    columnas = list(columnas) if columnas is not None else None
+    if formato == "csv":
+        tipos = _tipos_csv(ruta, columnas, tipar, texto=True)
+        for bloque in pd.read_csv(ruta, usecols=columnas, dtype=tipos, chunksize=tamano_bloque):
+            yield _tipar(bloque, tipar)
+        return
+
+    _requerir_pyarrow(formato)
+    import pyarrow as pa
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        lotes = pq.ParquetFile(ruta).iter_batches(batch_size=tamano_bloque, columns=columnas)
+    else:
+        import pyarrow.ipc as ipc
+        lector = ipc.open_file(ruta)
+        lotes = (
+            lector.get_batch(i).select(columnas) if columnas is not None else lector.get_batch(i)
+            for i in range(lector.num_record_batches)
+        )
+
+    for lote in lotes:
+        for inicio in range(0, lote.num_rows, tamano_bloque):
+            # Vía Table para respetar los tipos de pandas guardados en el esquema (p. ej. Int64)
+            tabla = pa.Table.from_batches([lote.slice(inicio, tamano_bloque)])
+            yield _tipar(tabla.to_pandas(), tipar)
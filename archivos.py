@@ -0,0 +1,52 @@
+# archivos.py
+"""
+Utilidades de archivos que comparten las caches y las etapas: el directorio
+de las caches, el hash del contenido (memorizado) y la escritura atómica (a un
+temporal en el mismo directorio y después os.replace, para que otro proceso
+nunca lea un archivo a medio escribir).
+"""
+
+import hashlib
+import os
+from contextlib import contextmanager
+
+# Raíz de las caches en disco (config NSE compilada, ubicaciones, etapas, tablas)
+DIRECTORIO_CACHE = os.environ.get("NSE_CACHE", ".cache")
+
+_HASHES = {}
+
+
+def hash_archivo(ruta: str) -> str:
+    """sha256 del contenido de `ruta` (memorizado por ruta + tamaño + fecha de modificación)."""
+    estado = os.stat(ruta)
+    clave = (os.path.abspath(ruta), estado.st_size, estado.st_mtime_ns)
+    if clave not in _HASHES:
+        h = hashlib.sha256()
+        with open(ruta, "rb") as file:
+            for bloque in iter(lambda: file.read(1 << 20), b""):
+                h.update(bloque)
+        _HASHES[clave] = h.hexdigest()
+    return _HASHES[clave]
+
+
+@contextmanager
+def escritura_atomica(ruta: str):
+    """
+    Da una ruta temporal para escribir `ruta`: en el mismo directorio, con la
+    misma extensión (para los formatos que se eligen por extensión) y única por
+    proceso. Al salir sin error reemplaza a `ruta` (si no se escribió nada,
+    `ruta` queda como estaba); con error, se borra.
+    """
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    raiz, extension = os.path.splitext(ruta)
+    temporal = f"{raiz}.{os.getpid()}.tmp{extension}"
+    try:
+        yield temporal
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    if os.path.exists(temporal):
+        os.replace(temporal, ruta)
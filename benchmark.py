@@ -0,0 +1,285 @@
+# benchmark.py
+"""
+Benchmark del pipeline sobre encuestas sintéticas (ver encuesta_sintetica.py).
+
+Para cada tamaño genera una encuesta en un directorio temporal y corre las
+etapas en orden (tablas, limpieza, nse, hipotesis_1, hipotesis_2), cada una en
+un proceso nuevo para que su pico de memoria (ru_maxrss) sea solo suyo. Mide
+tiempo de reloj, tiempo de CPU y memoria, y guarda todo en un JSON:
+
+    python benchmark.py --filas 1000 100000 1000000 --salida base.json
+    python benchmark.py --filas 1000 100000 1000000 --comparar base.json
+
+Con --comparar lista las etapas que empeoraron más que --tolerancia respecto
+del JSON anterior (y sale con código 1). Si las dos corridas difieren en
+semilla, --tamano-bloque, --procesos, formato del intermedio o entorno
+(versiones, plataforma, CPUs), no compara y sale con código 2; --forzar
+compara igual, avisando qué difiere. Con --tamano-bloque limpieza y nse
+corren por bloques (para tamaños que no entran en memoria); --procesos se pasa
+a las etapas que lo aceptan.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import ENCUESTA_CRUDA, ENCUESTA_LIMPIA
+from archivos import DIRECTORIO_CACHE
+from encuesta_sintetica import generar_encuesta
+from instrumentacion import cpu_hijos, pico_memoria_mb
+
+DIRECTORIO_REPO = os.path.dirname(os.path.abspath(__file__))
+CONFIG_NSE = "config_nse.json"
+FILAS = (1_000, 10_000, 100_000)
+TOLERANCIA = 0.25
+
+# Subir cuando cambie la forma del JSON de resultados
+VERSION_BENCHMARK = 1
+
+ETAPAS = ("tablas", "limpieza", "nse", "hipotesis_1", "hipotesis_2")
+
+# Etapas que necesitan la salida de otra (se corren antes aunque no se midan)
+PREREQUISITOS = {
+    "nse": ("limpieza",),
+    "hipotesis_1": ("limpieza",),
+    "hipotesis_2": ("nse",),
+}
+
+
+def _correr_etapa(nombre, tamano_bloque, procesos):
+    # Corre una etapa como lo haría main.py, leyendo y escribiendo en el directorio actual
+    if nombre == "tablas":
+        import tablas
+        tablas.main(tamano_bloque=tamano_bloque or tablas.TAMANO_BLOQUE)
+    elif nombre == "limpieza":
+        import limpieza
+        limpieza.main(tamano_bloque=tamano_bloque, procesos=procesos)
+    elif nombre == "nse":
+        import nse
+        if tamano_bloque:
+            nse.main_por_bloques(tamano_bloque=tamano_bloque, procesos=procesos)
+        else:
+            nse.main()
+    else:
+        import graficos
+        import hipotesis_1
+        import hipotesis_2
+        modulo = hipotesis_1 if nombre == "hipotesis_1" else hipotesis_2
+        modulo.guardar_figuras(directorio=graficos.DIRECTORIO_FIGURAS, formatos=("png",), procesos=procesos)
+
+
+def _memoria_mb(hijos=False):
+    pico = pico_memoria_mb(hijos)
+    return None if pico is None else round(pico, 1)
+
+
+def _medir(nombre, directorio, tamano_bloque, procesos):
+    # Corre en un proceso nuevo: el pico de memoria del proceso es el de la etapa
+    os.chdir(directorio)
+    if DIRECTORIO_REPO not in sys.path:
+        sys.path.insert(0, DIRECTORIO_REPO)
+    with open(os.devnull, "w") as nulo, redirect_stdout(nulo), redirect_stderr(nulo):
+        # Los imports no cuentan como tiempo de la etapa (sí en la memoria base)
+        import graficos  # noqa: F401
+        import hipotesis_1  # noqa: F401
+        import hipotesis_2  # noqa: F401
+        import limpieza  # noqa: F401
+        import nse  # noqa: F401
+        import tablas  # noqa: F401
+        base_mb = _memoria_mb()
+        cpu_hijos_inicial = cpu_hijos()
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        _correr_etapa(nombre, tamano_bloque, procesos)
+        segundos = time.perf_counter() - inicio
+        cpu = time.process_time() - inicio_cpu + cpu_hijos() - cpu_hijos_inicial
+    return {
+        "segundos": round(segundos, 4),
+        "cpu_segundos": round(cpu, 4),
+        "memoria_base_mb": base_mb,
+        "memoria_pico_mb": _memoria_mb(),
+        # Con `procesos` > 1: el mayor pico entre los procesos del pool (no la suma)
+        "memoria_pico_hijos_mb": _memoria_mb(hijos=True),
+    }
+
+
+def _en_proceso_nuevo(nombre, directorio, tamano_bloque, procesos):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(_medir, nombre, directorio, tamano_bloque, procesos).result()
+
+
+def _con_prerequisitos(etapas):
+    necesarias = set()
+
+    def agregar(nombre):
+        if nombre in necesarias:
+            return
+        necesarias.add(nombre)
+        for previa in PREREQUISITOS.get(nombre, ()):
+            agregar(previa)
+
+    for nombre in etapas:
+        if nombre not in ETAPAS:
+            raise ValueError(f"Etapa desconocida '{nombre}' (hay: {', '.join(ETAPAS)})")
+        agregar(nombre)
+    return [nombre for nombre in ETAPAS if nombre in necesarias]
+
+
+def correr(filas=FILAS, etapas=ETAPAS, repeticiones=1, semilla=0, tamano_bloque=None, procesos=None,
+           registro=print) -> dict:
+    """
+    Mide `etapas` para cada tamaño de `filas` y devuelve el resultado (lo que
+    se guarda como JSON). Cada medición es una fila de "resultados" con filas,
+    etapa, repetición, segundos, cpu_segundos y memoria en MB.
+    """
+    resultados = []
+    for n in filas:
+        with tempfile.TemporaryDirectory(prefix="benchmark-") as directorio:
+            shutil.copy(os.path.join(DIRECTORIO_REPO, CONFIG_NSE), directorio)
+            inicio = time.perf_counter()
+            generar_encuesta(os.path.join(directorio, ENCUESTA_CRUDA), n, semilla,
+                             ruta_base=os.path.join(DIRECTORIO_REPO, ENCUESTA_CRUDA))
+            registro(f"{n:>12,} filas: encuesta generada en {time.perf_counter() - inicio:.1f} s")
+
+            for nombre in _con_prerequisitos(etapas):
+                medir = nombre in etapas
+                for repeticion in range(repeticiones if medir else 1):
+                    # Sin caches de corridas anteriores (conteos de tablas, config compilada)
+                    shutil.rmtree(os.path.join(directorio, DIRECTORIO_CACHE), ignore_errors=True)
+                    medida = _en_proceso_nuevo(nombre, directorio, tamano_bloque, procesos)
+                    if not medir:
+                        continue
+                    resultados.append({"filas": n, "etapa": nombre, "repeticion": repeticion, **medida})
+                    registro(f"{n:>12,} filas: {nombre:<12} {medida['segundos']:>9.2f} s"
+                             f"  pico {medida['memoria_pico_mb']} MB")
+
+    return {
+        "version": VERSION_BENCHMARK,
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "entorno": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": {
+            "filas": list(filas),
+            "etapas": list(etapas),
+            "repeticiones": repeticiones,
+            "semilla": semilla,
+            "tamano_bloque": tamano_bloque,
+            "procesos": procesos,
+            "encuesta_limpia": os.path.basename(ENCUESTA_LIMPIA),
+        },
+        "resultados": resultados,
+    }
+
+
+def resumen_por_etapa(datos) -> dict:
+    """{(filas, etapa): (mejor tiempo entre repeticiones, mayor pico de memoria)}."""
+    resumen = {}
+    for fila in datos["resultados"]:
+        clave = (fila["filas"], fila["etapa"])
+        segundos, memoria = resumen.get(clave, (float("inf"), None))
+        pico = fila["memoria_pico_mb"]
+        memoria = pico if memoria is None else max(memoria, pico if pico is not None else memoria)
+        resumen[clave] = (min(segundos, fila["segundos"]), memoria)
+    return resumen
+
+
+# Lo que tiene que coincidir entre dos corridas para que sus tiempos sean comparables
+# (encuesta_limpia incluye la extensión, o sea el formato del intermedio)
+PARAMETROS_COMPARABLES = ("semilla", "tamano_bloque", "procesos", "encuesta_limpia")
+ENTORNO_COMPARABLE = ("python", "pandas", "numpy", "plataforma", "cpus")
+
+
+def diferencias_de_configuracion(base, actual) -> list:
+    """Parámetros y entorno en que difieren `base` y `actual` ("procesos: None → 4"), vacía si coinciden."""
+    diferencias = []
+    if base.get("version") != actual.get("version"):
+        diferencias.append(f"version: {base.get('version')} → {actual.get('version')}")
+    for seccion, claves in (("parametros", PARAMETROS_COMPARABLES), ("entorno", ENTORNO_COMPARABLE)):
+        anterior, nuevo = base.get(seccion, {}), actual.get(seccion, {})
+        for clave in claves:
+            if anterior.get(clave) != nuevo.get(clave):
+                diferencias.append(f"{clave}: {anterior.get(clave)} → {nuevo.get(clave)}")
+    return diferencias
+
+
+def comparar(base, actual, tolerancia=TOLERANCIA, forzar=False) -> list:
+    """
+    Regresiones de `actual` contra `base`: tiempo o memoria más de `tolerancia`
+    (proporción) peor. Lanza ValueError si las corridas tienen distintos
+    parámetros o entorno (ver diferencias_de_configuracion), salvo con `forzar`.
+    """
+    diferencias = diferencias_de_configuracion(base, actual)
+    if diferencias and not forzar:
+        raise ValueError("Corridas no comparables (usar --forzar para comparar igual):\n  - "
+                         + "\n  - ".join(diferencias))
+    anteriores = resumen_por_etapa(base)
+    regresiones = []
+    for clave, (segundos, memoria) in sorted(resumen_por_etapa(actual).items()):
+        if clave not in anteriores:
+            continue
+        segundos_base, memoria_base = anteriores[clave]
+        filas, etapa = clave
+        if segundos > segundos_base * (1 + tolerancia):
+            regresiones.append(f"{etapa} ({filas:,} filas): {segundos_base:.2f} s → {segundos:.2f} s")
+        if memoria is not None and memoria_base is not None and memoria > memoria_base * (1 + tolerancia):
+            regresiones.append(f"{etapa} ({filas:,} filas): {memoria_base} MB → {memoria} MB")
+    return regresiones
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline sobre encuestas sintéticas")
+    parser.add_argument("--filas", type=int, nargs="+", default=list(FILAS))
+    parser.add_argument("--etapas", nargs="+", default=list(ETAPAS), choices=ETAPAS)
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--tamano-bloque", type=int, default=None)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--salida", default="benchmark.json")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--forzar", action="store_true",
+                        help="comparar aunque difieran los parámetros o el entorno")
+    opciones = parser.parse_args(argumentos)
+
+    datos = correr(opciones.filas, opciones.etapas, opciones.repeticiones, opciones.semilla,
+                   opciones.tamano_bloque, opciones.procesos)
+    with open(opciones.salida, "w", encoding="utf-8") as file:
+        json.dump(datos, file, ensure_ascii=False, indent=2)
+    print(f"Resultados en {opciones.salida}")
+
+    if opciones.comparar:
+        with open(opciones.comparar, encoding="utf-8") as file:
+            base = json.load(file)
+        try:
+            regresiones = comparar(base, datos, opciones.tolerancia, opciones.forzar)
+        except ValueError as error:
+            print(f"✗ {error}")
+            return 2
+        for diferencia in diferencias_de_configuracion(base, datos):
+            print(f"⚠ distinta configuración: {diferencia}")
+        for regresion in regresiones:
+            print(f"⚠ {regresion}")
+        if regresiones:
+            return 1
+        print("Sin regresiones.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# cache_ubicaciones.py
+"""
+Cache en disco (SQLite) de la resolución de ubicaciones de limpieza:
+texto normalizado + cutoff → partido/comuna canónico u 'otro'.
+
+Las respuestas de residencia casi no cambian entre olas de la encuesta, así
+que lo resuelto en una corrida (por índice de tokens o fuzzy completo) queda
+guardado para las siguientes y para los demás procesos del pool: una corrida
+sobre datos ya vistos no puntúa nada.
+
+La clave incluye la firma de los alias (hash de claves_busqueda.CANONICOS, con
+su orden, que decide los empates), la versión de rapidfuzz y
+VERSION_RESOLUCION: si cambia cualquiera de ellos, lo guardado con otra firma
+se descarta al abrir. La base usa WAL, así que muchos procesos pueden leer y
+escribir a la vez; si no se puede usar (disco de solo lectura, base bloqueada
+más de ESPERA_BLOQUEO segundos) se avisa una vez y se sigue sin la cache.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import warnings
+
+import rapidfuzz
+
+from archivos import DIRECTORIO_CACHE
+from claves_busqueda import CANONICOS
+
+RUTA_CACHE_UBICACIONES = os.path.join(DIRECTORIO_CACHE, "ubicaciones.sqlite")
+
+# Subir cuando cambie cómo limpieza resuelve un texto (invalida lo guardado)
+VERSION_RESOLUCION = 1
+
+# Segundos que un proceso espera a que otro libere la base antes de rendirse
+ESPERA_BLOQUEO = 30.0
+
+# Parámetros por consulta (SQLite admite al menos 999)
+_LOTE_CONSULTA = 500
+
+
+def firma_alias() -> str:
+    """Hash de lo que determina la etiqueta de un texto: alias, rapidfuzz y versión."""
+    contenido = json.dumps(
+        {"canonicos": CANONICOS, "rapidfuzz": rapidfuzz.__version__, "version": VERSION_RESOLUCION},
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheUbicaciones:
+    """Tabla (firma, cutoff, texto) → etiqueta en SQLite. Una conexión por proceso."""
+
+    __slots__ = ("ruta", "firma", "_conexion", "_pid")
+
+    def __init__(self, ruta=RUTA_CACHE_UBICACIONES, firma=None):
+        self.ruta = ruta
+        self.firma = firma or firma_alias()
+        self._conexion = None
+        self._pid = None
+
+    def _conectar(self):
+        # Las conexiones no sobreviven a un fork: cada proceso del pool abre la suya
+        if self._conexion is not None and self._pid == os.getpid():
+            return self._conexion
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS ubicaciones ("
+            " firma TEXT NOT NULL, cutoff INTEGER NOT NULL, texto TEXT NOT NULL, etiqueta TEXT NOT NULL,"
+            " PRIMARY KEY (firma, cutoff, texto)) WITHOUT ROWID"
+        )
+        # Lo resuelto con otros alias ya no sirve
+        conexion.execute("DELETE FROM ubicaciones WHERE firma != ?", (self.firma,))
+        self._conexion, self._pid = conexion, os.getpid()
+        return conexion
+
+    def buscar(self, textos, cutoff: int) -> dict:
+        """{texto: etiqueta} de los `textos` que ya están resueltos para este `cutoff`."""
+        textos = list(textos)
+        encontrados = {}
+        conexion = self._conectar()
+        for inicio in range(0, len(textos), _LOTE_CONSULTA):
+            lote = textos[inicio:inicio + _LOTE_CONSULTA]
+            marcas = ",".join("?" * len(lote))
+            filas = conexion.execute(
+                f"SELECT texto, etiqueta FROM ubicaciones WHERE firma = ? AND cutoff = ? AND texto IN ({marcas})",
+                [self.firma, int(cutoff), *lote],
+            )
+            encontrados.update(filas)
+        return encontrados
+
+    def guardar(self, etiquetas: dict, cutoff: int):
+        """Agrega {texto: etiqueta} (en una transacción; lo que ya estaba no se toca)."""
+        if not etiquetas:
+            return
+        conexion = self._conectar()
+        with conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            conexion.executemany(
+                "INSERT OR IGNORE INTO ubicaciones (firma, cutoff, texto, etiqueta) VALUES (?, ?, ?, ?)",
+                [(self.firma, int(cutoff), texto, etiqueta) for texto, etiqueta in etiquetas.items()],
+            )
+
+    def cantidad(self) -> int:
+        return self._conectar().execute("SELECT COUNT(*) FROM ubicaciones").fetchone()[0]
+
+    def limpiar(self):
+        """Borra todo lo guardado (de cualquier firma)."""
+        self._conectar().execute("DELETE FROM ubicaciones")
+
+    def cerrar(self):
+        if self._conexion is not None and self._pid == os.getpid():
+            self._conexion.close()
+        self._conexion = self._pid = None
+
+
+_CACHE = None
+_DESHABILITADA = False
+
+
+def cache_ubicaciones(ruta=RUTA_CACHE_UBICACIONES):
+    """La cache compartida del proceso, o None si no se puede usar (se avisó una vez)."""
+    global _CACHE
+    if _DESHABILITADA:
+        return None
+    if _CACHE is None or _CACHE.ruta != ruta:
+        _CACHE = CacheUbicaciones(ruta)
+    return _CACHE
+
+
+def deshabilitar(error):
+    """Sigue sin cache en disco (avisando) después de un error de SQLite."""
+    global _DESHABILITADA
+    if not _DESHABILITADA:
+        warnings.warn(f"Cache de ubicaciones en disco deshabilitada: {error}", RuntimeWarning, stacklevel=2)
+    _DESHABILITADA = True
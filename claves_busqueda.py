@@ -5,6 +5,10 @@ Clasificación de respuestas libres de residencia hacia etiquetas canónicas.
 - GBA: por PARTIDO (como antes).
 - CABA: por COMUNA (1 a 15). Se mantiene 'caba' como alias general cuando no se especifica barrio.
 
+Además se construye (una sola vez, al importar) un índice invertido token → alias
+(INDICE_TOKENS) para acotar el fuzzy matching a los pocos alias que comparten
+alguna palabra con la respuesta (ver `candidatos_por_tokens`).
+
 Uso con RapidFuzz:
     from rapidfuzz import process, fuzz
     from claves_busqueda import CLAVES_NORMALIZADAS, A_CANONICO
@@ -244,8 +248,29 @@ for canon, variantes in CANONICOS.items():
             CLAVES_NORMALIZADAS.append(nv)
             A_CANONICO[nv] = canon
 
+# Índice invertido: token → alias que lo contienen (en el orden de CLAVES_NORMALIZADAS,
+# así un extractOne sobre los candidatos desempata igual que sobre la lista completa)
+INDICE_TOKENS: Dict[str, List[str]] = {}
+
+for clave in CLAVES_NORMALIZADAS:
+    for token in dict.fromkeys(clave.split()):
+        INDICE_TOKENS.setdefault(token, []).append(clave)
+
+_POSICION_CLAVE: Dict[str, int] = {clave: i for i, clave in enumerate(CLAVES_NORMALIZADAS)}
+
+
+def candidatos_por_tokens(texto_norm: str) -> List[str]:
+    """Alias que comparten al menos un token con `texto_norm` (ya normalizado)."""
+    candidatos = set()
+    for token in texto_norm.split():
+        candidatos.update(INDICE_TOKENS.get(token, ()))
+    return sorted(candidatos, key=_POSICION_CLAVE.__getitem__)
+
+
 __all__ = [
     "CANONICOS",
     "CLAVES_NORMALIZADAS",
     "A_CANONICO",
+    "INDICE_TOKENS",
+    "candidatos_por_tokens",
 ]
@@ -0,0 +1,91 @@
+# columnas.py
+"""
+Resolución de columnas del formulario por número de pregunta ("4" → "4- Barrio/Localidad...").
+
+Las etapas buscan sus columnas por el número de pregunta para ser robustas a
+cambios de redacción. El número se parsea una sola vez por encabezado (el
+registro de preguntas, cacheado): "1" es la pregunta 1 y no también la 10–19,
+y buscar una columna no recorre el encabezado. Los nombres que no son de
+pregunta ("percentil NSE") se buscan por prefijo de texto. Cuando no hay un
+DataFrame a mano, el encabezado se lee del archivo sin parsear filas (ver
+almacenamiento.leer_encabezado) y se cachea por ruta + fecha de modificación.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+import almacenamiento
+from almacenamiento import ENCUESTA_CRUDA
+
+# "8 - ¿Conoce...", "15- ¿De 1 a 5..." → pregunta 8, 15
+_PREGUNTA = re.compile(r"\s*(\d+)\s*-")
+
+# Prefijo que es un número de pregunta: "8", "8 -", "15-"
+_PREFIJO_PREGUNTA = re.compile(r"\s*(\d+)\s*-?\s*")
+
+
+@lru_cache(maxsize=None)
+def _leer_encabezado(ruta: str, mtime_ns: int) -> tuple:
+    return almacenamiento.leer_encabezado(ruta)
+
+
+def leer_encabezado(ruta: str = ENCUESTA_CRUDA) -> tuple:
+    """Nombres de columnas del archivo en `ruta` (CSV, Parquet o Feather), sin leer filas."""
+    return _leer_encabezado(ruta, os.stat(ruta).st_mtime_ns)
+
+
+def numero_pregunta(nombre):
+    """Número de pregunta al principio de `nombre` ("15- ¿De 1 a 5..." → 15), o None."""
+    coincidencia = _PREGUNTA.match(str(nombre))
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+@lru_cache(maxsize=256)
+def _registro(columnas: tuple) -> dict:
+    registro = {}
+    for posicion, nombre in enumerate(columnas):
+        numero = numero_pregunta(nombre)
+        if numero is not None:
+            registro.setdefault(numero, (posicion, nombre))  # la primera, si hay repetidas
+    return registro
+
+
+def registro_preguntas(columnas) -> dict:
+    """{número de pregunta: (posición, nombre de la columna)} del encabezado `columnas`."""
+    return dict(_registro(tuple(columnas)))
+
+
+def buscar_columna(columnas, prefijo):
+    """
+    Columna de `columnas` para `prefijo` o None: si `prefijo` es un número de
+    pregunta (8, "8", "8 -"), la de esa pregunta; si no, la primera cuyo nombre
+    empieza con `prefijo`.
+    """
+    coincidencia = _PREFIJO_PREGUNTA.fullmatch(str(prefijo))
+    if coincidencia:
+        encontrada = _registro(tuple(columnas)).get(int(coincidencia.group(1)))
+        return encontrada[1] if encontrada else None
+    for col in columnas:
+        if str(col).startswith(prefijo):
+            return col
+    return None
+
+
+def columna_por_prefijo(columnas, prefijo) -> str:
+    """Como `buscar_columna`, con error si no hay ninguna columna para `prefijo`."""
+    col = buscar_columna(columnas, prefijo)
+    if col is None:
+        raise ValueError(f"No se encontró columna que empiece con '{prefijo}'")
+    return col
+
+
+def columnas_por_prefijo(columnas, prefijos) -> list:
+    """Columnas de `prefijos` en el orden del encabezado (para `usecols`/`columnas` al leer)."""
+    elegidas = {columna_por_prefijo(columnas, prefijo) for prefijo in prefijos}
+    return [col for col in columnas if col in elegidas]
+
+
+def columna(prefijo, ruta: str = ENCUESTA_CRUDA) -> str:
+    """Como `columna_por_prefijo`, resolviendo contra el encabezado del archivo en `ruta`."""
+    return columna_por_prefijo(leer_encabezado(ruta), prefijo)
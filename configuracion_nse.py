@@ -0,0 +1,225 @@
+# configuracion_nse.py
+"""
+config_nse.json "compilado" para el motor vectorizado de nse.py.
+
+ConfiguracionNSE es un objeto inmutable (con __slots__) que guarda, por componente:
+  - las categorías como CategoricalDtype (categoría → código entero),
+  - la tabla de puntajes como array (con un NaN al final para el código -1),
+  - la tabla ya normalizada min–max con sus propios extremos,
+y los pesos como array, su suma y los pesos normalizados.
+
+Se valida al compilar (estructura y tipos del JSON) y se cachea en disco, en
+archivos.DIRECTORIO_CACHE, con el hash del archivo como clave: mientras config_nse.json
+no cambie, los trabajos siguientes (y los procesos en paralelo) lo cargan ya
+compilado.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from archivos import DIRECTORIO_CACHE, escritura_atomica
+from esquema import codigos
+
+# Subir cuando cambie la forma del objeto compilado (invalida la cache en disco)
+VERSION_COMPILADO = 2
+
+# Componente → tabla de puntajes en el JSON. El orden es el de suma del compuesto.
+TABLAS_COMPONENTES = {
+    "barrio":    "puntajes_barrio",
+    "educacion": "puntajes_educacion",
+    "trabajo":   "puntajes_trabajo",
+    "ocupacion": "puntajes_ocupacion",
+}
+
+
+def normalizar_tabla(tabla, rango_min_max):
+    """
+    Puntajes de `tabla` llevados a [0, 1] con los extremos `rango_min_max`,
+    con las mismas reglas que nse.normalizar_minmax_0_1 (sin datos → NaN;
+    rango 0 → 0.5 en todas las posiciones, incluso la de NaN).
+    """
+    minimo, maximo = rango_min_max
+    if np.isnan(minimo):
+        return np.full(len(tabla), np.nan)
+
+    rango = maximo - minimo
+    if rango == 0.0:
+        return np.full(len(tabla), 0.5)
+    return (tabla - minimo) / rango
+
+
+def _solo_lectura(array):
+    array.setflags(write=False)
+    return array
+
+
+class ConfiguracionNSE:
+    """Configuración NSE validada y precompilada en arrays. Inmutable."""
+
+    __slots__ = (
+        "firma",
+        "componentes",
+        "tipos",
+        "puntajes",
+        "rangos_tabla",
+        "puntajes_0_1",
+        "ponderados",
+        "pesos",
+        "suma_pesos",
+        "pesos_normalizados",
+    )
+
+    def __init__(self, firma, componentes, tipos, puntajes, ponderados, pesos):
+        set_ = object.__setattr__
+        set_(self, "firma", firma)
+        set_(self, "componentes", tuple(componentes))
+        set_(self, "tipos", tuple(tipos))
+        set_(self, "puntajes", tuple(_solo_lectura(np.array(p, dtype=float)) for p in puntajes))
+
+        rangos = []
+        for tabla in self.puntajes:
+            rangos.append((float(np.nanmin(tabla)), float(np.nanmax(tabla))))
+        set_(self, "rangos_tabla", tuple(rangos))
+        set_(self, "puntajes_0_1", tuple(
+            _solo_lectura(normalizar_tabla(tabla, rango)) for tabla, rango in zip(self.puntajes, rangos)
+        ))
+
+        # La suma se acumula en el mismo orden que combinar_componentes_normalizados
+        suma = 0.0
+        for peso in pesos:
+            suma += peso
+        set_(self, "ponderados", tuple(ponderados))
+        set_(self, "pesos", _solo_lectura(np.array(pesos, dtype=float)))
+        set_(self, "suma_pesos", suma)
+        set_(self, "pesos_normalizados", _solo_lectura(self.pesos / suma))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("ConfiguracionNSE es inmutable")
+
+    def __reduce__(self):
+        # Para pickle (cache en disco y envío a procesos): se guardan los arrays ya
+        # calculados y se restauran tal cual, sin validar ni recalcular nada
+        return (_restaurar, (tuple(getattr(self, nombre) for nombre in self.__slots__),))
+
+    def indice(self, componente):
+        return self.componentes.index(componente)
+
+    def categorias(self, componente):
+        return list(self.tipos[self.indice(componente)].categories)
+
+    def tabla(self, componente):
+        """Puntajes crudos por código (el último elemento, NaN, es el del código -1)."""
+        return self.puntajes[self.indice(componente)]
+
+    def codificar(self, componente, serie):
+        """Código entero de cada valor de `serie` (-1 = sin mapeo o NaN)."""
+        # get_indexer y no pd.Categorical(serie, dtype=...): da los mismos códigos sin
+        # la advertencia de pandas por valores fuera de las categorías (si `serie`
+        # es categórica, se busca cada categoría una vez: ver esquema.codigos)
+        return codigos(serie, self.tipos[self.indice(componente)].categories)
+
+    def puntajes_normalizados(self, componente, rango_min_max):
+        """Tabla normalizada con `rango_min_max`; usa la precalculada si coincide con el de la tabla."""
+        i = self.indice(componente)
+        if tuple(rango_min_max) == self.rangos_tabla[i]:
+            return self.puntajes_0_1[i]
+        return normalizar_tabla(self.puntajes[i], rango_min_max)
+
+    def sin_mapeo(self, componente, serie):
+        """Valores distintos (no NaN) de `serie` que no están en la tabla del componente."""
+        valores = pd.unique(serie.dropna())
+        conocidas = set(self.categorias(componente))
+        return sorted(str(v) for v in valores if v not in conocidas)
+
+
+def _restaurar(valores):
+    config = object.__new__(ConfiguracionNSE)
+    for nombre, valor in zip(ConfiguracionNSE.__slots__, valores):
+        # Los arrays vuelven de pickle escribibles
+        if isinstance(valor, np.ndarray):
+            valor = _solo_lectura(valor)
+        elif isinstance(valor, tuple):
+            valor = tuple(_solo_lectura(v) if isinstance(v, np.ndarray) else v for v in valor)
+        object.__setattr__(config, nombre, valor)
+    return config
+
+
+def validar_configuracion(config):
+    """Lista de problemas de estructura del JSON (vacía si está bien)."""
+    problemas = []
+    for componente, clave in TABLAS_COMPONENTES.items():
+        tabla = config.get(clave)
+        if not isinstance(tabla, dict) or not tabla:
+            problemas.append(f"falta la tabla '{clave}' o está vacía")
+            continue
+        for categoria, puntaje in tabla.items():
+            if not isinstance(puntaje, (int, float)) or isinstance(puntaje, bool):
+                problemas.append(f"'{clave}'['{categoria}'] no es numérico: {puntaje!r}")
+
+    pesos = config.get("pesos")
+    if not isinstance(pesos, dict) or not pesos:
+        problemas.append("falta 'pesos' o está vacío")
+        return problemas
+    for componente, peso in pesos.items():
+        if componente not in TABLAS_COMPONENTES:
+            problemas.append(f"peso para componente desconocido '{componente}'")
+        elif not isinstance(peso, (int, float)) or isinstance(peso, bool) or peso < 0:
+            problemas.append(f"peso de '{componente}' inválido: {peso!r}")
+    if not problemas and sum(pesos.values()) <= 0:
+        problemas.append("la suma de los pesos debe ser positiva")
+    return problemas
+
+
+def compilar_configuracion(config, firma=""):
+    """Valida el dict de config_nse.json y lo compila. Lanza ValueError si hay problemas."""
+    problemas = validar_configuracion(config)
+    if problemas:
+        raise ValueError("config_nse.json inválido:\n  - " + "\n  - ".join(problemas))
+
+    componentes = list(TABLAS_COMPONENTES)
+    tipos, puntajes = [], []
+    for componente in componentes:
+        tabla = config[TABLAS_COMPONENTES[componente]]
+        tipos.append(pd.CategoricalDtype(list(tabla.keys())))
+        puntajes.append([float(v) for v in tabla.values()] + [np.nan])
+
+    ponderados = [c for c in componentes if c in config["pesos"]]
+    pesos = [config["pesos"][c] for c in ponderados]
+    return ConfiguracionNSE(firma, componentes, tipos, puntajes, ponderados, pesos)
+
+
+_COMPILADAS = {}
+
+
+def cargar_configuracion_compilada(ruta_config, directorio_cache=DIRECTORIO_CACHE):
+    """
+    Devuelve config_nse.json compilado, desde memoria, desde la cache en disco
+    (clave: sha256 del archivo) o compilándolo y guardándolo en la cache.
+    """
+    with open(ruta_config, "rb") as file:
+        contenido = file.read()
+    firma = hashlib.sha256(contenido).hexdigest()
+    if firma in _COMPILADAS:
+        return _COMPILADAS[firma]
+
+    ruta_cache = os.path.join(directorio_cache, f"config_nse-v{VERSION_COMPILADO}-{firma[:16]}.pkl")
+    config = None
+    if os.path.exists(ruta_cache):
+        try:
+            with open(ruta_cache, "rb") as file:
+                config = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            config = None  # cache corrupta: se recompila
+
+    if config is None or config.firma != firma:
+        config = compilar_configuracion(json.loads(contenido.decode("utf-8")), firma)
+        with escritura_atomica(ruta_cache) as temporal, open(temporal, "wb") as file:
+            pickle.dump(config, file)
+
+    _COMPILADAS[firma] = config
+    return config
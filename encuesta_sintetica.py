@@ -0,0 +1,154 @@
+# encuesta_sintetica.py
+"""
+Encuestas sintéticas del tamaño que se quiera, para medir el pipeline (ver
+benchmark.py) más allá de las ~124 filas de Encuesta.csv.
+
+Cada fila es una respuesta real de Encuesta.csv elegida al azar (con
+reposición), así que se conservan los encabezados exactos, la distribución de
+cada respuesta y las combinaciones entre preguntas (p. ej. los saltos de P6→P7
+y P8→P9–14). Sobre eso:
+  - la Marca temporal avanza de a intervalos aleatorios desde la primera real;
+  - una proporción de las respuestas de barrio/localidad (P4) se reemplaza por
+    un alias de claves_busqueda.CANONICOS escrito con errores (letras de más o
+    de menos, transposiciones, tildes, mayúsculas), con P3 acorde (CABA/GBA).
+    Los alias con errores salen de un conjunto de `variantes` textos, para que
+    la cantidad de textos distintos (lo que cuesta el fuzzy matching) no crezca
+    sin límite con las filas, como pasa con las respuestas reales.
+
+Es determinística: la misma `semilla` y los mismos parámetros dan el mismo
+archivo. Se escribe por bloques, con memoria acotada.
+"""
+
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import ENCUESTA_CRUDA
+from claves_busqueda import CANONICOS
+from columnas import columna_por_prefijo
+
+FORMATO_MARCA = "%d/%m/%Y %H:%M:%S"
+PROPORCION_ALIAS = 0.5
+VARIANTES_ALIAS = 20_000
+TAMANO_BLOQUE = 100_000
+
+# Segundos medios entre respuestas consecutivas
+INTERVALO_MEDIO = 30.0
+
+# Posiciones de 'AAAA-MM-DDTHH:MM:SS' (ISO) que forman 'DD/MM/AAAA HH:MM:SS'
+_ISO_A_MARCA = [8, 9, 7, 5, 6, 4, 0, 1, 2, 3, 10, 11, 12, 13, 14, 15, 16, 17, 18]
+
+_TILDES = {"a": "á", "e": "é", "i": "í", "o": "ó", "u": "ú", "n": "ñ"}
+
+
+def con_errores(texto: str, rng) -> str:
+    """`texto` con 0 a 2 errores de tipeo y una capitalización al azar."""
+    letras = list(texto)
+    for _ in range(rng.integers(0, 3)):
+        if len(letras) < 3:
+            break
+        i = int(rng.integers(0, len(letras) - 1))
+        error = rng.integers(0, 4)
+        if error == 0:
+            del letras[i]
+        elif error == 1:
+            letras.insert(i, letras[i])
+        elif error == 2:
+            letras[i], letras[i + 1] = letras[i + 1], letras[i]
+        else:
+            letras[i] = _TILDES.get(letras[i], letras[i])
+    texto = "".join(letras)
+
+    capitalizacion = rng.integers(0, 4)
+    if capitalizacion == 0:
+        texto = texto.title()
+    elif capitalizacion == 1:
+        texto = texto.upper()
+    elif capitalizacion == 2:
+        texto = texto.capitalize()
+    # Como en las respuestas reales, a veces queda un espacio al final
+    return texto + " " if rng.random() < 0.1 else texto
+
+
+def variantes_de_alias(cantidad: int, rng):
+    """
+    `cantidad` alias de CANONICOS (uniformes entre todos) con errores.
+    Devuelve (textos, residencias) con residencia "CABA" o "GBA" según el canónico.
+    """
+    alias = [(variante, canonico) for canonico, variantes in CANONICOS.items() for variante in variantes]
+    elegidos = rng.integers(0, len(alias), cantidad)
+    textos, residencias = [], []
+    for i in elegidos:
+        variante, canonico = alias[i]
+        textos.append(con_errores(variante, rng))
+        residencias.append("CABA" if canonico == "caba" or canonico.startswith("comuna") else "GBA")
+    return np.array(textos, dtype=object), np.array(residencias, dtype=object)
+
+
+def _campos_csv(campos) -> str:
+    # Campos ya separados por comas y entre comillas donde haga falta (como to_csv)
+    # (el terminador "\r\n" es para que se citen los campos con saltos de línea; se descarta)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\r\n").writerow(["" if pd.isna(c) else c for c in campos])
+    return buffer.getvalue()[:-2]
+
+
+def _por_fila(df: pd.DataFrame) -> np.ndarray:
+    return np.array([_campos_csv(fila) for fila in df.itertuples(index=False)], dtype=object)
+
+
+def marcas_temporales(inicio, segundos) -> np.ndarray:
+    """Marcas 'DD/MM/AAAA HH:MM:SS' a `segundos` de `inicio` (vectorizado)."""
+    iso = np.datetime_as_string(np.datetime64(inicio, "s") + segundos.astype("timedelta64[s]"), unit="s")
+    letras = iso.astype("U19").view("U1").reshape(-1, 19)[:, _ISO_A_MARCA]
+    letras[:, [2, 5]] = "/"
+    letras[:, 10] = " "
+    return np.ascontiguousarray(letras).view("U19").ravel().astype(object)
+
+
+def generar_encuesta(ruta: str, filas: int, semilla: int = 0, ruta_base: str = ENCUESTA_CRUDA,
+                     proporcion_alias: float = PROPORCION_ALIAS, variantes: int = VARIANTES_ALIAS,
+                     tamano_bloque: int = TAMANO_BLOQUE) -> int:
+    """
+    Escribe en `ruta` (CSV, como el export del formulario) una encuesta de
+    `filas` respuestas remuestreadas de `ruta_base`. Devuelve las filas escritas.
+    """
+    base = pd.read_csv(ruta_base, dtype=str)
+    col_residencia = base.columns.get_loc(columna_por_prefijo(base.columns, "3"))
+    col_barrio = base.columns.get_loc(columna_por_prefijo(base.columns, "4"))
+    if (col_residencia, col_barrio) != (3, 4):
+        raise ValueError("Se espera Marca temporal, P1, P2, P3, P4, ... en ese orden")
+
+    # Cada fila real ya serializada en partes; las filas se arman pegando texto
+    medio = _por_fila(base.iloc[:, 1:3])
+    residencias = np.array([_campos_csv([v]) for v in base.iloc[:, 3]], dtype=object)
+    barrios = np.array([_campos_csv([v]) for v in base.iloc[:, 4]], dtype=object)
+    cola = _por_fila(base.iloc[:, 5:])
+
+    rng = np.random.default_rng(semilla)
+    textos_alias, residencias_alias = variantes_de_alias(variantes, rng)
+    textos_alias = np.array([_campos_csv([t]) for t in textos_alias], dtype=object)
+    marca = pd.to_datetime(base.iloc[0, 0], format=FORMATO_MARCA).to_datetime64()
+    segundos_previos = 0.0
+
+    with open(ruta, "w", encoding="utf-8", newline="") as file:
+        file.write(_campos_csv(base.columns) + "\n")
+        for inicio in range(0, filas, tamano_bloque):
+            n = min(tamano_bloque, filas - inicio)
+            elegidas = rng.integers(0, len(base), n)
+
+            segundos = segundos_previos + np.cumsum(rng.exponential(INTERVALO_MEDIO, n))
+            segundos_previos = segundos[-1]
+
+            residencia, barrio = residencias[elegidas], barrios[elegidas]
+            con_alias = np.flatnonzero(rng.random(n) < proporcion_alias)
+            alias = rng.integers(0, variantes, len(con_alias))
+            barrio[con_alias] = textos_alias[alias]
+            residencia[con_alias] = residencias_alias[alias]
+
+            lineas = (marcas_temporales(marca, segundos) + "," + medio[elegidas] + "," + residencia
+                      + "," + barrio + "," + cola[elegidas] + "\n")
+            file.write("".join(lineas))
+    return filas
@@ -0,0 +1,114 @@
+# esquema.py
+"""
+Tipos declarados de las columnas del intermedio (Encuesta_limpia), para que
+todas las etapas lo tengan en memoria con códigos enteros y no como texto:
+
+  - respuestas cerradas (residencia, barrio, educación, condición laboral,
+    ocupación): categóricas con las categorías que aparezcan;
+  - P8, P20 y nivel socioeconómico: categóricas ordenadas con un orden fijo
+    (el de los gráficos); un valor fuera del orden no se pierde, se agrega
+    al final;
+  - P15/P16 (Likert 1–5): Int8 (entero nullable de 1 byte; lo que no sea un
+    entero de 1 byte queda como NA, como ya hace limpieza);
+  - percentil NSE (0–100, redondeado): float32.
+
+almacenamiento lo aplica al leer el intermedio, limpieza al terminar y nse al
+agregar sus columnas. Los archivos no cambian: al escribirlos los valores salen
+igual que como texto.
+
+Lo que sí cambia para quien calcula con las columnas: un P15/P16 faltante es NA
+(Int8) y no NaN (float), y una comparación como `p15 >= 4` da NA en esa fila, no
+False. Cada uso tiene que decidir qué hace con el faltante (hipotesis_1 lo
+cuenta como "no alta", igual que antes: ver porcentaje_relevancia_alta). El
+percentil en float32 es exacto (enteros de 0 a 100).
+"""
+
+import numpy as np
+import pandas as pd
+
+ORDEN_P8 = ["Si", "No"]
+ORDEN_P20 = ["siempre", "a veces", "nunca", "otro"]
+ORDEN_NSE = ["Bajo", "Medio bajo", "Medio", "Medio alto", "Alto"]
+
+# Número de pregunta o prefijo de la columna (ver columnas.buscar_columna) →
+# "category", "Int8", "float32" o lista con el orden de las categorías
+ESQUEMA_INTERMEDIO = {
+    "3": "category",
+    "4": "category",
+    "5": "category",
+    "6": "category",
+    "7": "category",
+    "8": ORDEN_P8,
+    "15": "Int8",
+    "16": "Int8",
+    "20": ORDEN_P20,
+    "percentil NSE": "float32",
+    "nivel socioeconómico": ORDEN_NSE,
+}
+
+
+def tipos_por_columna(columnas, esquema=ESQUEMA_INTERMEDIO) -> dict:
+    """{columna: tipo} de las `columnas` que tienen tipo declarado en `esquema`."""
+    # Import acá: columnas importa almacenamiento, que importa este módulo
+    from columnas import buscar_columna
+
+    tipos = {}
+    for prefijo, tipo in esquema.items():
+        columna = buscar_columna(columnas, prefijo)
+        if columna is not None:
+            tipos[columna] = tipo
+    return tipos
+
+
+def tipos_lectura(columnas, esquema=ESQUEMA_INTERMEDIO) -> dict:
+    """
+    `dtype` para read_csv: las categóricas se parsean directo como "category"
+    (sin pasar por una columna de texto); el resto lo convierte aplicar_esquema.
+    """
+    return {col: "category" for col, tipo in tipos_por_columna(columnas, esquema).items()
+            if tipo == "category" or isinstance(tipo, list)}
+
+
+def categorica_ordenada(serie: pd.Series, orden) -> pd.Series:
+    """`serie` como categórica ordenada según `orden`; los valores que no están van al final (ordenados)."""
+    presentes = serie.cat.categories if isinstance(serie.dtype, pd.CategoricalDtype) else pd.unique(serie.dropna())
+    extras = sorted(str(v) for v in presentes if v not in orden)
+    return serie.astype(pd.CategoricalDtype(list(orden) + extras, ordered=True))
+
+
+def entero_chico(serie: pd.Series) -> pd.Series:
+    # Int8 siempre (el tipo no depende de los valores del bloque): lo que no es
+    # un entero entre -128 y 127 queda como NA
+    numerica = pd.to_numeric(serie, errors="coerce")
+    return numerica.where((numerica == numerica.round()) & (numerica.abs() <= 127)).astype("Int8")
+
+
+def convertir(serie: pd.Series, tipo) -> pd.Series:
+    """`serie` con el `tipo` de ESQUEMA_INTERMEDIO."""
+    if isinstance(tipo, list):
+        return categorica_ordenada(serie, tipo)
+    if tipo == "category":
+        return serie if isinstance(serie.dtype, pd.CategoricalDtype) else serie.astype("category")
+    if tipo == "Int8":
+        return entero_chico(serie)
+    return pd.to_numeric(serie, errors="coerce").astype(tipo)
+
+
+def aplicar_esquema(df: pd.DataFrame, esquema=ESQUEMA_INTERMEDIO) -> pd.DataFrame:
+    """Convierte (sobre el mismo `df`) cada columna que tenga tipo declarado en `esquema`. Devuelve `df`."""
+    for columna, tipo in tipos_por_columna(df.columns, esquema).items():
+        df[columna] = convertir(df[columna], tipo)
+    return df
+
+
+def codigos(serie: pd.Series, categorias) -> np.ndarray:
+    """
+    Índice en `categorias` de cada valor de `serie` (-1 si no está o es NaN).
+    Con una categórica se busca cada categoría una vez, no cada fila.
+    """
+    indice = pd.Index(categorias)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Código -1 (NaN) → último elemento → -1
+        por_categoria = np.append(indice.get_indexer(serie.cat.categories), -1)
+        return por_categoria[serie.cat.codes.to_numpy()]
+    return indice.get_indexer(serie)
@@ -0,0 +1,320 @@
+# etapas.py
+"""
+Orquestación de etapas con cache de resultados (la usa main.py).
+
+Cada Etapa declara:
+  - `dependencias`: etapas cuyo resultado recibe como argumentos (en ese orden),
+  - `archivos`: archivos de entrada que lee directamente (p. ej. config_nse.json),
+  - `modulos`: módulos cuyo código define la versión de la etapa,
+  - `salidas`: archivos que escribe (si falta alguno o cambió, se vuelve a correr),
+  - `parametros`: otros valores que cambian el resultado (rutas, flags).
+
+La clave de una etapa es un sha256 de todo eso más las claves de sus
+dependencias, así que cambiar config_nse.json cambia la clave de nse y, en
+cascada, la de las etapas que usan su resultado, pero no la de limpieza.
+Las etapas con clave conocida (y salidas intactas) no se corren: su resultado
+se lee de DIRECTORIO_ETAPAS solo si alguna etapa que sí corre lo necesita.
+De cada etapa se guarda solo el último resultado: al escribir uno se borran
+los de claves anteriores.
+
+Las etapas con `persistir=False` (p. ej. leer el CSV crudo) no se guardan: se
+corren solo cuando alguna etapa que depende de ellas tiene que correr. Las que
+además no son dependencia de ninguna (p. ej. mostrar los gráficos en pantalla)
+corren siempre: lo que importa es su efecto, no un resultado.
+
+Cada etapa que corre queda medida en la traza de instrumentacion.py (si está
+activa); las que salen de la cache, como un evento.
+"""
+
+import hashlib
+import io
+import os
+import pickle
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import redirect_stderr, redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+import instrumentacion
+from archivos import DIRECTORIO_CACHE, escritura_atomica, hash_archivo
+
+DIRECTORIO_ETAPAS = os.path.join(DIRECTORIO_CACHE, "etapas")
+
+# Subir cuando cambie el formato de lo guardado (invalida la cache de etapas)
+VERSION_ETAPAS = 1
+
+
+class Etapa:
+    """Una etapa del pipeline: función + lo que determina su resultado."""
+
+    __slots__ = ("nombre", "funcion", "dependencias", "archivos", "modulos", "salidas", "parametros", "persistir")
+
+    def __init__(self, nombre, funcion, dependencias=(), archivos=(), modulos=(), salidas=(),
+                 parametros=None, persistir=True):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.dependencias = tuple(dependencias)
+        self.archivos = tuple(archivos)
+        self.modulos = tuple(modulos)
+        self.salidas = tuple(salidas)
+        self.parametros = parametros or {}
+        self.persistir = persistir
+
+
+def _hash_o_none(ruta: str):
+    return hash_archivo(ruta) if os.path.exists(ruta) else None
+
+
+def version_codigo(modulos) -> str:
+    """Hash del código fuente de `modulos` (nombres de módulo importables)."""
+    h = hashlib.sha256()
+    for nombre in modulos:
+        modulo = sys.modules.get(nombre) or __import__(nombre)
+        h.update(nombre.encode("utf-8"))
+        h.update(hash_archivo(modulo.__file__).encode("ascii"))
+    return h.hexdigest()
+
+
+def orden_topologico(etapas) -> list:
+    """Etapas ordenadas de forma que cada una queda después de sus dependencias."""
+    por_nombre = {etapa.nombre: etapa for etapa in etapas}
+    orden, visitadas, en_curso = [], set(), set()
+
+    def visitar(etapa):
+        if etapa.nombre in visitadas:
+            return
+        if etapa.nombre in en_curso:
+            raise ValueError(f"Ciclo de dependencias en la etapa '{etapa.nombre}'")
+        en_curso.add(etapa.nombre)
+        for dependencia in etapa.dependencias:
+            if dependencia not in por_nombre:
+                raise ValueError(f"La etapa '{etapa.nombre}' depende de '{dependencia}', que no está declarada")
+            visitar(por_nombre[dependencia])
+        en_curso.discard(etapa.nombre)
+        visitadas.add(etapa.nombre)
+        orden.append(etapa)
+
+    for etapa in etapas:
+        visitar(etapa)
+    return orden
+
+
+def clave_etapa(etapa, claves_dependencias) -> str:
+    partes = [
+        f"v{VERSION_ETAPAS}",
+        f"pandas={pd.__version__}",
+        f"numpy={np.__version__}",
+        etapa.nombre,
+        version_codigo(etapa.modulos),
+        repr(sorted(etapa.parametros.items())),
+    ]
+    partes += [f"{ruta}={hash_archivo(ruta)}" for ruta in etapa.archivos]
+    partes += [f"{nombre}={claves_dependencias[nombre]}" for nombre in etapa.dependencias]
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+def _ruta_cache(etapa, clave, directorio):
+    return os.path.join(directorio, f"{etapa.nombre}-{clave[:24]}.pkl")
+
+
+# Cada archivo de la cache tiene dos pickles seguidos: el hash de las salidas
+# (chico, se lee al planificar) y el resultado (se lee solo si hace falta).
+
+def _leer_salidas(ruta):
+    try:
+        with open(ruta, "rb") as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _leer_resultado(ruta):
+    with open(ruta, "rb") as file:
+        pickle.load(file)
+        return pickle.load(file)
+
+
+def _vigente(etapa, salidas) -> bool:
+    # Sirve si existe y las salidas en disco son las que escribió la etapa
+    if salidas is None:
+        return False
+    return all(_hash_o_none(ruta) == salidas.get(ruta) for ruta in etapa.salidas)
+
+
+def _guardar_registro(ruta, resultado, etapa):
+    with escritura_atomica(ruta) as temporal, open(temporal, "wb") as file:
+        pickle.dump({r: _hash_o_none(r) for r in etapa.salidas}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(resultado, file, protocol=pickle.HIGHEST_PROTOCOL)
+    _podar(ruta, etapa)
+
+
+def _podar(ruta, etapa):
+    # Borra los resultados de la misma etapa con otra clave (la cache no crece con cada cambio)
+    directorio, actual = os.path.split(ruta)
+    patron = re.compile(rf"{re.escape(etapa.nombre)}-[0-9a-f]{{24}}\.pkl")
+    for nombre in os.listdir(directorio):
+        if nombre != actual and patron.fullmatch(nombre):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except FileNotFoundError:
+                pass  # otro proceso ya lo borró
+
+
+def planificar(etapas, usar_cache=True, forzar=(), directorio=DIRECTORIO_ETAPAS):
+    """
+    Calcula la clave de cada etapa y decide cuáles hay que correr.
+    Devuelve (orden, claves, a_correr, registros) donde `registros` tiene la
+    ruta del resultado cacheado vigente de cada etapa que no se corre.
+    """
+    orden = orden_topologico(etapas)
+    claves, registros, a_correr = {}, {}, set()
+    for etapa in orden:
+        claves[etapa.nombre] = clave_etapa(etapa, claves)
+        if not etapa.persistir:
+            continue
+        ruta = _ruta_cache(etapa, claves[etapa.nombre], directorio)
+        salidas = _leer_salidas(ruta) if usar_cache else None
+        # Si corre una dependencia, corre también esta: puede pisar sus salidas (p. ej. el intermedio)
+        depende_de_otra = any(dependencia in a_correr for dependencia in etapa.dependencias)
+        if etapa.nombre in forzar or depende_de_otra or not _vigente(etapa, salidas):
+            a_correr.add(etapa.nombre)
+        else:
+            registros[etapa.nombre] = ruta
+
+    # Las etapas sin persistir corren solo si alguna etapa que corre las necesita,
+    # o siempre si ninguna las necesita
+    necesitadas = {dependencia for etapa in orden for dependencia in etapa.dependencias}
+    for etapa in reversed(orden):
+        if not etapa.persistir and etapa.nombre not in necesitadas:
+            a_correr.add(etapa.nombre)
+        if etapa.nombre in a_correr:
+            for dependencia in etapa.dependencias:
+                if dependencia not in registros:
+                    a_correr.add(dependencia)
+    return orden, claves, a_correr, registros
+
+
+class _EnLinea:
+    # Mismo submit() que un ProcessPoolExecutor, pero corre en el proceso actual
+    def submit(self, funcion, *argumentos):
+        futuro = Future()
+        try:
+            futuro.set_result(funcion(*argumentos))
+        except BaseException as error:
+            futuro.set_exception(error)
+        return futuro
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+def _filas_entrada(argumentos):
+    cantidades = [n for n in map(instrumentacion.filas, argumentos) if n is not None]
+    return sum(cantidades) if cantidades else None
+
+
+def _correr_medida(nombre, funcion, argumentos):
+    # Corre la etapa dentro de una medición (no hace nada si la instrumentación está apagada)
+    with instrumentacion.medir(nombre, categoria="etapa", filas_entrada=_filas_entrada(argumentos)) as medida:
+        resultado = funcion(*argumentos)
+        medida["filas_salida"] = instrumentacion.filas(resultado)
+    return resultado
+
+
+def _correr_capturando(nombre, funcion, argumentos):
+    # Corre la etapa juntando lo que imprime, para volcarlo después en orden
+    salida = io.StringIO()
+    inicio = time.perf_counter()
+    with redirect_stdout(salida), redirect_stderr(salida):
+        resultado = _correr_medida(nombre, funcion, argumentos)
+    return resultado, salida.getvalue(), time.perf_counter() - inicio
+
+
+def ejecutar(etapas, usar_cache=True, forzar=(), registro=print, directorio=DIRECTORIO_ETAPAS,
+             procesos=None) -> dict:
+    """
+    Corre las etapas cuyo resultado no está en cache (o las de `forzar`). Con
+    `procesos` > 1 las etapas independientes corren a la vez en un
+    ProcessPoolExecutor (las de `persistir=False` siempre en este proceso).
+
+    Lo que imprime cada etapa se captura y se pasa a `registro` junto con su
+    encabezado, siempre en el orden topológico de las etapas (el mismo con o
+    sin procesos). Devuelve {nombre: "ejecutada" | "cache"}.
+    """
+    orden, claves, a_correr, registros = planificar(etapas, usar_cache, forzar, directorio)
+    resultados, estados, logs = {}, {}, {}
+    for etapa in orden:
+        if etapa.persistir and etapa.nombre not in a_correr:
+            estados[etapa.nombre] = "cache"
+            instrumentacion.evento(etapa.nombre, categoria="cache")
+            logs[etapa.nombre] = f"▷ {etapa.nombre}: sin cambios (cache)\n"
+
+    def argumentos_de(etapa):
+        argumentos = []
+        for dependencia in etapa.dependencias:
+            if dependencia not in resultados:
+                resultados[dependencia] = _leer_resultado(registros[dependencia])
+            argumentos.append(resultados[dependencia])
+        return argumentos
+
+    def lista(etapa):
+        return all(d in resultados or d in registros for d in etapa.dependencias)
+
+    emitidas = 0
+
+    def emitir():
+        # Vuelca los logs listos sin saltear ninguno: el orden no depende de cuál termina antes
+        nonlocal emitidas
+        while emitidas < len(orden) and (orden[emitidas].nombre in logs or not orden[emitidas].persistir):
+            texto = logs.pop(orden[emitidas].nombre, "")
+            for linea in texto.splitlines():
+                registro(linea)
+            emitidas += 1
+
+    pendientes = [etapa for etapa in orden if etapa.nombre in a_correr]
+    en_vuelo = {}
+    ejecutor = ProcessPoolExecutor(max_workers=procesos) if procesos and procesos > 1 else _EnLinea()
+    with ejecutor:
+        try:
+            while pendientes or en_vuelo:
+                for etapa in [e for e in pendientes if lista(e)]:
+                    pendientes.remove(etapa)
+                    if etapa.persistir:
+                        futuro = ejecutor.submit(_correr_capturando, etapa.nombre, etapa.funcion,
+                                                 argumentos_de(etapa))
+                        en_vuelo[futuro] = etapa
+                    else:
+                        resultados[etapa.nombre] = _correr_medida(etapa.nombre, etapa.funcion, argumentos_de(etapa))
+                if not en_vuelo:
+                    continue
+
+                hechos, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    etapa = en_vuelo.pop(futuro)
+                    resultado, salida, segundos = futuro.result()
+                    resultados[etapa.nombre] = resultado
+                    _guardar_registro(_ruta_cache(etapa, claves[etapa.nombre], directorio), resultado, etapa)
+                    estados[etapa.nombre] = "ejecutada"
+                    logs[etapa.nombre] = f"▶ {etapa.nombre} ({segundos:.1f} s)\n{salida}"
+                emitir()
+        finally:
+            for futuro in en_vuelo:
+                futuro.cancel()
+            emitir()
+    return estados
+
+
+def limpiar_cache(directorio=DIRECTORIO_ETAPAS):
+    """Borra todos los resultados de etapas guardados."""
+    if not os.path.isdir(directorio):
+        return
+    for nombre in os.listdir(directorio):
+        if nombre.endswith(".pkl"):
+            os.remove(os.path.join(directorio, nombre))
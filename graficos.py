@@ -0,0 +1,137 @@
+# graficos.py
+"""
+Salida de las figuras de hipotesis_1 e hipotesis_2.
+
+Cada módulo arma una lista de (nombre, función que dibuja la figura) y elige:
+  - mostrar(): como siempre, una ventana por figura (plt.show()), o
+  - guardar(): modo batch sin pantalla (backend Agg) que escribe cada figura
+    en `directorio` en los formatos pedidos, la cierra y devuelve las rutas.
+
+Las figuras son independientes entre sí: con `procesos` > 1 cada una se dibuja
+en su propio proceso (matplotlib dibuja en un solo hilo). Por eso cada función
+de `figuras` ya viene con solo las columnas que usa, que es lo que viaja al
+proceso. guardar_conjuntos() reparte en el mismo pool varios conjuntos de
+figuras (p. ej. un directorio por región).
+
+Los archivos salen idénticos entre corridas (sin fecha en los metadatos de
+SVG/PDF, con ids de SVG fijos y con el jitter de los stripplot sembrado), para
+que la cache de etapas de main.py pueda comparar salidas por hash.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+
+from instrumentacion import medir
+
+DIRECTORIO_FIGURAS = "figuras"
+FORMATOS_FIGURA = ("png", "svg", "pdf")
+SEMILLA_JITTER = 0
+
+# Metadatos que por defecto llevan la fecha de creación
+_METADATOS = {
+    "png": None,
+    "svg": {"Date": None},
+    "pdf": {"CreationDate": None, "ModDate": None},
+}
+
+
+@contextmanager
+def backend_sin_pantalla():
+    """
+    Pasa matplotlib a Agg (no necesita display ni bloquea en plt.show()) y al
+    salir vuelve al backend que había: quien llama (p. ej. un notebook) puede
+    seguir mostrando figuras.
+    """
+    anterior = matplotlib.get_backend()
+    if anterior.lower() == "agg":
+        yield
+        return
+    plt.switch_backend("Agg")
+    try:
+        yield
+    finally:
+        plt.switch_backend(anterior)
+
+
+def rutas_figuras(nombres, directorio=DIRECTORIO_FIGURAS, formatos=FORMATOS_FIGURA) -> list:
+    """Rutas que escribe guardar() para esos `nombres` (sin dibujar nada)."""
+    return [os.path.join(directorio, f"{nombre}.{formato}") for nombre in nombres for formato in formatos]
+
+
+def mostrar(figuras):
+    """Dibuja y muestra cada figura de `figuras` [(nombre, dibujar)], una por vez."""
+    for nombre, dibujar in figuras:
+        with medir(nombre, categoria="figura"):
+            dibujar()
+        plt.show()
+
+
+def _guardar_figura(nombre, dibujar, directorio, formatos) -> list:
+    # Dibuja y guarda una figura; corre igual en este proceso o en uno del pool.
+    # No toca las figuras que ya estaban abiertas: solo cierra las que crea.
+    previas = set(plt.get_fignums())
+    estado_aleatorio = np.random.get_state()
+    try:
+        with backend_sin_pantalla():
+            # Figura nueva como actual: las que dibujan sobre plt.gca() no usan una de quien llama
+            plt.figure()
+            # seaborn usa el generador global de NumPy para el jitter
+            np.random.seed(SEMILLA_JITTER)
+            with plt.rc_context({"svg.hashsalt": nombre}), medir(nombre, categoria="figura") as medida:
+                try:
+                    dibujar()
+                    figura = plt.gcf()
+                    rutas = []
+                    for formato in formatos:
+                        ruta = os.path.join(directorio, f"{nombre}.{formato}")
+                        figura.savefig(ruta, format=formato, metadata=_METADATOS.get(formato))
+                        rutas.append(ruta)
+                    medida["archivos"] = len(rutas)
+                    return rutas
+                finally:
+                    for numero in set(plt.get_fignums()) - previas:
+                        plt.close(numero)
+    finally:
+        np.random.set_state(estado_aleatorio)
+
+
+def guardar_conjuntos(conjuntos, formatos=FORMATOS_FIGURA, procesos=None) -> dict:
+    """
+    Como guardar() para varios conjuntos {directorio: figuras} a la vez,
+    repartiendo todas las figuras en un solo pool si `procesos` > 1.
+    Devuelve {directorio: rutas escritas, en orden}.
+    """
+    trabajos = []
+    for directorio, figuras in conjuntos.items():
+        os.makedirs(directorio, exist_ok=True)
+        trabajos += [(directorio, nombre, dibujar) for nombre, dibujar in figuras]
+
+    if procesos and procesos > 1 and len(trabajos) > 1:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(trabajos))) as executor:
+            futuros = [
+                executor.submit(_guardar_figura, nombre, dibujar, directorio, tuple(formatos))
+                for directorio, nombre, dibujar in trabajos
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+    else:
+        resultados = [_guardar_figura(nombre, dibujar, directorio, formatos) for directorio, nombre, dibujar in trabajos]
+
+    rutas = {directorio: [] for directorio in conjuntos}
+    for (directorio, _, _), escritas in zip(trabajos, resultados):
+        rutas[directorio] += escritas
+    return rutas
+
+
+def guardar(figuras, directorio=DIRECTORIO_FIGURAS, formatos=FORMATOS_FIGURA, procesos=None) -> list:
+    """
+    Dibuja cada figura de `figuras` [(nombre, dibujar)] con el backend Agg y la
+    guarda como `directorio`/`nombre`.`formato` para cada formato. Cierra cada
+    figura después de guardarla. Con `procesos` > 1 dibuja una figura por
+    proceso. Devuelve las rutas escritas, en orden.
+    """
+    return guardar_conjuntos({directorio: figuras}, formatos, procesos)[directorio]
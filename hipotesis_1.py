@@ -10,32 +10,39 @@ import seaborn as sns
 import matplotlib.pyplot as plt  
 import numpy as np
 
+from functools import partial
 from matplotlib.patches import Patch
 from matplotlib.lines import Line2D
 
+import graficos
+import resumenes
+from almacenamiento import ENCUESTA_LIMPIA, leer_encabezado, leer_intermedio
+from columnas import columna_por_prefijo
+from esquema import ORDEN_P20
+
 
 # ============================= Configuración ============================ #
-DATA_PATH = "Encuesta_limpia.csv"
+DATA_PATH = ENCUESTA_LIMPIA
 sns.set_theme(style="whitegrid")
 
 
 # ============================== Carga & Cols =========================== #
 
-def cargar_datos(path: str = DATA_PATH) -> pd.DataFrame:
-    """Lee el CSV de trabajo y devuelve un DataFrame."""
-    return pd.read_csv(path)
+def cargar_datos(path: str = DATA_PATH, columnas=None) -> pd.DataFrame:
+    """Lee el archivo de trabajo (todas las columnas o solo `columnas`) y devuelve un DataFrame."""
+    return leer_intermedio(path, columnas)
 
 
-def detectar_columnas(df: pd.DataFrame) -> dict:
+def detectar_columnas(df) -> dict:
     """
-    Detecta columnas por prefijo textual (robusto a cambios de redacción).
+    Detecta columnas por número de pregunta (robusto a cambios de redacción).
+    Acepta un DataFrame o directamente la lista de nombres de columnas.
     Retorna un dict con claves: 'p8', 'p15', 'p16', 'p20'.
     """
+    nombres = getattr(df, "columns", df)
+
     def tomar_col(prefijo: str) -> str:
-        cols = df.columns[df.columns.str.startswith(prefijo)]
-        if len(cols) == 0:
-            raise ValueError(f"No se encontró columna que empiece con '{prefijo}'")
-        return cols[0]
+        return columna_por_prefijo(nombres, prefijo)
 
     cols = {
         "p8": tomar_col("8"),
@@ -56,7 +63,8 @@ def construir_features(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
       1) 'exposicion': deriva a partir de P8 mapeando "Si"→"Expuesto/a", "No"→"No expuesto/a"
          (cualquier otro valor queda como "Otro").
       2) Tipado numérico: convierte P15 y P16 a numérico con errors='coerce' (valores no parsables → NaN).
-      3) 'relevancia_alta': bandera booleana que vale True cuando P15 ≥ 4 (alto/muy alto).
+      3) 'relevancia_alta': bandera booleana que vale True cuando P15 ≥ 4 (alto/muy alto)
+         y False en otro caso, incluso si falta P15.
       4) P20 categórica ordenada: define el orden analítico ["siempre", "a veces", "nunca", "otro"]
          para que gráficos/tablas respeten esa secuencia (no alfabética).
 
@@ -68,34 +76,32 @@ def construir_features(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
 
     # 1) Exposición a partir de P8
     exp_map = {"Si": "Expuesto/a", "No": "No expuesto/a"}
-    out["exposicion"] = out[cols["p8"]].map(exp_map).fillna("Otro")
+    # (a object antes del fillna: si P8 es categórica, "Otro" no es una de sus categorías)
+    out["exposicion"] = out[cols["p8"]].map(exp_map).astype(object).fillna("Otro")
 
     # 2) Conversión a numérico para P15 y P16
     out[cols["p15"]] = pd.to_numeric(out[cols["p15"]], errors="coerce")
     out[cols["p16"]] = pd.to_numeric(out[cols["p16"]], errors="coerce")
 
-    # 3) Bandera de relevancia alta (4 o 5)
-    out["relevancia_alta"] = (out[cols["p15"]] >= 4)
+    # 3) Bandera de relevancia alta (4 o 5). P15 faltante cuenta como "no alta"
+    #    (P15 es entera nullable: la comparación da NA ahí, no False)
+    out["relevancia_alta"] = (out[cols["p15"]] >= 4).fillna(False).astype(bool)
 
     # 4) Categorización ordenada para P20
-    categorias_p20 = ["siempre", "a veces", "nunca", "otro"]
-    out[cols["p20"]] = pd.Categorical(out[cols["p20"]], categories=categorias_p20, ordered=True)
+    out[cols["p20"]] = pd.Categorical(out[cols["p20"]], categories=ORDEN_P20, ordered=True)
 
     return out
 
 # ================================= Gráficos ============================ #
 
-def grafico_proporcion_relevancia_alta_por_exposicion(df: pd.DataFrame, cols: dict):
+def grafico_proporcion_relevancia_alta_por_exposicion(conteos: pd.DataFrame, cols: dict):
     """
     Gráfico 1: porcentaje de personas que califican la relevancia (P15) como alta/muy alta (≥4),
     comparando grupos de exposición (P8). Eje Y en %.
+    `conteos`: filas por (exposicion, relevancia_alta), ver resumir().
     """
-    # 1) Calcular proporción de 'relevancia_alta' por grupo y llevarla a porcentaje
-    tabla = (
-        df.dropna(subset=["relevancia_alta"])
-          .groupby("exposicion")["relevancia_alta"]
-          .mean() * 100.0
-    ).reset_index(name="porcentaje")
+    # 1) Calcular proporción de 'relevancia_alta' por grupo (sobre todo el grupo) y llevarla a porcentaje
+    tabla = porcentaje_relevancia_alta(conteos).reset_index(name="porcentaje")
 
     # 2) Mantener solo los grupos de interés y ordenarlos para el eje X
     orden_grupos = ["Expuesto/a", "No expuesto/a"]
@@ -116,15 +122,18 @@ def grafico_proporcion_relevancia_alta_por_exposicion(df: pd.DataFrame, cols: di
     return ax
 
 
-def grafico_distribucion_p15_por_exposicion(df: pd.DataFrame, cols: dict):
+def grafico_distribucion_p15_por_exposicion(conteos: pd.DataFrame, cols: dict):
     """
     Gráfico 2: distribución de P15 (1–5) por grupo de exposición.
     Combina: violín (forma de la distribución) + puntos (casos) + mediana con intervalo.
+    `conteos`: filas por (exposicion, P15). Violín y puntos usan una muestra por
+    cuotas (resumenes.MAX_PUNTOS_MUESTRA por grupo); mediana e intervalo, todos los casos.
     """
     # 1) Datos válidos y orden claro de grupos (solo los dos principales)
     orden_grupos = ["Expuesto/a", "No expuesto/a"]
-    datos = df.dropna(subset=[cols["p15"], "exposicion"])
-    datos = datos[datos["exposicion"].isin(orden_grupos)]
+    conteos = conteos.dropna(subset=[cols["p15"], "exposicion"])
+    conteos = conteos[conteos["exposicion"].isin(orden_grupos)]
+    datos = resumenes.muestra_por_cuotas(conteos, "exposicion", cols["p15"])
 
     # 2) Violín: muestra la forma de la distribución por grupo
     ax = sns.violinplot(
@@ -142,16 +151,16 @@ def grafico_distribucion_p15_por_exposicion(df: pd.DataFrame, cols: dict):
         size=3, alpha=0.4, color="k", jitter=True,
     )
 
-    # 4) Mediana + intervalo percentil 95% superpuestos
-    #    (Usamos un estimador compatible con arrays de NumPy para evitar errores.)
-    sns.pointplot(
-        data=datos,
-        x="exposicion", y=cols["p15"],
-        order=orden_grupos,
-        estimator=lambda v: float(pd.Series(v).median()),
-        errorbar=("pi", 95),
-        markers="D", linestyles="", color="black",
-    )
+    # 4) Mediana + intervalo percentil 95% superpuestos (desde los conteos)
+    for i, grupo in enumerate(orden_grupos):
+        filas = conteos[conteos["exposicion"] == grupo]
+        if filas.empty:
+            continue
+        valores, n = filas[cols["p15"]].to_numpy(dtype=float), filas["n"].to_numpy()
+        mediana = resumenes.mediana_desde_conteos(valores, n)
+        bajo, alto = (resumenes.cuantil_desde_conteos(valores, n, q) for q in (0.025, 0.975))
+        ax.errorbar(i, mediana, yerr=[[mediana - bajo], [alto - mediana]], fmt="D", color="black",
+                    elinewidth=1.8 * plt.rcParams["lines.linewidth"])
 
     # 5) Etiquetas y límites
     ax.set(
@@ -165,19 +174,21 @@ def grafico_distribucion_p15_por_exposicion(df: pd.DataFrame, cols: dict):
     return ax
 
 
-def grafico_donut_concentrico_p15_expuesto_vs_no(df: pd.DataFrame, cols: dict):
+def grafico_donut_concentrico_p15_expuesto_vs_no(conteos: pd.DataFrame, cols: dict):
     """
     Donut concéntrico (2 anillos):
       Exterior: Expuesto/a
       Interior: No expuesto/a
+    `conteos`: filas por (exposicion, P15).
     """
 
     # --- 1) Datos ---
     grupos = ["Expuesto/a", "No expuesto/a"]
-    datos = df[df["exposicion"].isin(grupos)].dropna(subset=[cols["p15"], "exposicion"])
+    datos = conteos[conteos["exposicion"].isin(grupos)].dropna(subset=[cols["p15"], "exposicion"])
 
     p15_discreta = datos[cols["p15"]].round().clip(1, 5).astype(int)
-    tabla = pd.crosstab(index=datos["exposicion"], columns=p15_discreta, normalize="index") * 100.0
+    tabla = datos.groupby(["exposicion", p15_discreta])["n"].sum().unstack(fill_value=0)
+    tabla = tabla.div(tabla.sum(axis=1), axis=0) * 100.0
     categorias = [1, 2, 3, 4, 5]
     for c in categorias:
         if c not in tabla.columns:
@@ -252,15 +263,17 @@ def grafico_donut_concentrico_p15_expuesto_vs_no(df: pd.DataFrame, cols: dict):
 
 
 
-def grafico_likert_p20_por_exposicion_horizontal(df: pd.DataFrame, cols: dict):
+def grafico_likert_p20_por_exposicion_horizontal(conteos: pd.DataFrame, cols: dict):
+    # `conteos`: filas por (exposicion, P20)
     import matplotlib.pyplot as plt
 
-    datos = df.dropna(subset=[cols["p20"], "exposicion"]).copy()
+    datos = conteos.dropna(subset=[cols["p20"], "exposicion"]).copy()
     orden = ["Expuesto/a", "No expuesto/a"]
     mapa = {"nunca": -1, "a veces": 0, "siempre": 1, "otro": 0}
     datos["p20_mapeada"] = datos[cols["p20"]].map(mapa)
 
-    tabla = (pd.crosstab(datos["exposicion"], datos["p20_mapeada"], normalize="index") * 100.0)
+    tabla = datos.groupby(["exposicion", "p20_mapeada"], observed=True)["n"].sum().unstack(fill_value=0)
+    tabla = tabla.div(tabla.sum(axis=1), axis=0) * 100.0
     for c in (-1,0,1):
         if c not in tabla.columns: tabla[c] = 0.0
     tabla = tabla[[ -1, 0, 1 ]].reindex([g for g in orden if g in tabla.index])
@@ -291,31 +304,84 @@ def grafico_likert_p20_por_exposicion_horizontal(df: pd.DataFrame, cols: dict):
 
 # ================================== Main =============================== #
 
-def main():
-    df = cargar_datos(DATA_PATH)
+NOMBRES_FIGURAS = ["figura_1", "figura_2", "figura_3", "figura_4"]
+
+
+def resumir(df: pd.DataFrame) -> dict:
+    """
+    Tablas resumen de H1 (ver resumenes.py), de una sola pasada sobre `df`:
+    conteos por (exposición, P15, P20, relevancia alta) y sus marginales
+    'relevancia', 'p15' y 'p20'. Incluye 'cols' (nombres de columnas).
+    """
     cols = detectar_columnas(df)
     df_features = construir_features(df, cols)
+    conjunta = resumenes.conteos(df_features, ["exposicion", cols["p15"], cols["p20"], "relevancia_alta"])
+    return {
+        "cols": cols,
+        "relevancia": resumenes.marginal(conjunta, ["exposicion", "relevancia_alta"]),
+        "p15": resumenes.marginal(conjunta, ["exposicion", cols["p15"]]),
+        "p20": resumenes.marginal(conjunta, ["exposicion", cols["p20"]]),
+    }
 
-    # Gráfico 1
-    grafico_proporcion_relevancia_alta_por_exposicion(df_features, cols)
-    plt.show()
 
+def porcentaje_relevancia_alta(conteos: pd.DataFrame) -> pd.Series:
+    """
+    % de relevancia alta por grupo de exposición desde `conteos` (filas por
+    exposicion, relevancia_alta). El denominador son todas las personas del
+    grupo: P15 faltante cuenta como "no alta".
+    """
+    altos = conteos["n"].where(conteos["relevancia_alta"].fillna(False).astype(bool), 0)
+    return altos.groupby(conteos["exposicion"]).sum() / conteos.groupby("exposicion")["n"].sum() * 100.0
 
-    # Gráfico 2
-    grafico_distribucion_p15_por_exposicion(df_features, cols)
-    plt.show()
 
-    # Gráfico 3
-    grafico_donut_concentrico_p15_expuesto_vs_no(df_features, cols)
-    plt.show()
+def figuras(resumen: dict) -> list:
+    """
+    Figuras 1–4 como [(nombre, función que la dibuja)], en orden. Cada función
+    lleva solo su tabla resumen (lo que viaja a otro proceso).
+    """
+    cols = resumen["cols"]
+    graficos_y_tablas = [
+        (grafico_proporcion_relevancia_alta_por_exposicion, "relevancia"),
+        (grafico_distribucion_p15_por_exposicion, "p15"),
+        (grafico_donut_concentrico_p15_expuesto_vs_no, "p15"),
+        (grafico_likert_p20_por_exposicion_horizontal, "p20"),
+    ]
+    return [
+        (nombre, partial(funcion, resumen[clave], cols))
+        for nombre, (funcion, clave) in zip(NOMBRES_FIGURAS, graficos_y_tablas)
+    ]
 
 
-    # Gráfico 4
-    grafico_likert_p20_por_exposicion_horizontal(df_features, cols)
-    plt.show()
+def _preparar(df, ruta, resumen):
+    # Sin resúmenes ni `df`, lee de `ruta` solo las columnas P8/P15/P16/P20
+    if resumen is not None:
+        return resumen
+    if df is None:
+        cols = detectar_columnas(leer_encabezado(ruta))
+        df = cargar_datos(ruta, cols.values())
+    return resumir(df)
 
 
+def guardar_figuras(df: pd.DataFrame = None, ruta: str = DATA_PATH,
+                    directorio: str = graficos.DIRECTORIO_FIGURAS,
+                    formatos=graficos.FORMATOS_FIGURA, procesos: int = None, resumen: dict = None) -> list:
+    """
+    Modo batch (sin pantalla): escribe las Figuras 1–4 en `directorio` en cada
+    uno de `formatos` (con `procesos` > 1, una figura por proceso) y devuelve
+    las rutas de los archivos. Con `resumen` (de resumir()) no usa `df`.
+    """
+    return graficos.guardar(figuras(_preparar(df, ruta, resumen)), directorio, formatos, procesos)
+
 
+def main(df: pd.DataFrame = None, ruta: str = DATA_PATH, resumen: dict = None) -> dict:
+    """
+    Genera los gráficos de H1 desde las tablas resumen (`resumen`, o resumir(df);
+    si `df` es None lee de `ruta` solo las columnas P8/P15/P16/P20).
+    Devuelve las tablas resumen.
+    """
+    resumen = _preparar(df, ruta, resumen)
+    graficos.mostrar(figuras(resumen))
+    return resumen
 
 
 if __name__ == "__main__":
@@ -1,21 +1,27 @@
 # hipotesis_2.py
 # Hipótesis 2: NSE percibido bajo → mayor probabilidad de exposición
 
+from functools import partial
+
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+import graficos
+import resumenes
+from almacenamiento import ENCUESTA_LIMPIA, leer_intermedio
+from columnas import columna_por_prefijo, columnas_por_prefijo, leer_encabezado
+from esquema import ORDEN_NSE  # orden lógico del NSE para ejes/tablas
+
 # ===================== Configuración básica ===================== #
-RUTA_CSV = "Encuesta_limpia.csv"
+RUTA_CSV = ENCUESTA_LIMPIA
 
 # Nombres de columnas (ajusta si en tu dataset se llaman distinto)
-COL_EXPOSICION = "8 - ¿Conoce o recuerda algún caso de procedimientos policiales inadecuados y/o violentos?"  # "Si"/"No"
+PREGUNTA_EXPOSICION = "8"                   # "Si"/"No"; la columna se busca por número de pregunta
+COL_EXPOSICION = "exposicion"               # P8 normalizada ("si"/"no") en las tablas resumen
 COL_NSE_CAT    = "nivel socioeconómico"     # "Bajo", "Medio bajo", "Medio", "Medio alto", "Alto"
 COL_NSE_SCORE  = "percentil NSE"            # numérico (0–100, por ejemplo)
 
-# Orden lógico del NSE para ejes/tablas
-ORDEN_NSE = ["Bajo", "Medio bajo", "Medio", "Medio alto", "Alto"]
-
 sns.set_theme(style="whitegrid")
 
 
@@ -24,20 +30,23 @@ def _columna_expuesto_booleano(df: pd.DataFrame) -> pd.Series:
     Devuelve una serie booleana True/False a partir de la P8:
     'Si' => True (Expuesto/a), 'No' => False. Ignora otros valores.
     """
-    s = df[COL_EXPOSICION].astype(str).str.strip().str.lower()
+    s = df[columna_por_prefijo(df.columns, PREGUNTA_EXPOSICION)].astype(str).str.strip().str.lower()
     mapa = {"si": True, "no": False}
     return s.map(mapa)
 
 
 # ============= Gráfico 1: % de “Expuesto/a” por nivel socioeconómico ============= #
-def grafico_divergente_si_no_por_nse(df: pd.DataFrame):
-    """Barras 100% divergentes: composición 'Si' vs 'No' por NSE."""
-    resp = df[COL_EXPOSICION].astype(str).str.strip().str.lower()
-    datos = pd.DataFrame({COL_EXPOSICION: resp, COL_NSE_CAT: df[COL_NSE_CAT]}).dropna()
+def grafico_divergente_si_no_por_nse(conteos: pd.DataFrame):
+    """
+    Barras 100% divergentes: composición 'Si' vs 'No' por NSE.
+    `conteos`: filas por (NSE, P8 normalizada), ver resumir().
+    """
+    datos = conteos.dropna(subset=[COL_NSE_CAT]).copy()
     datos[COL_NSE_CAT] = pd.Categorical(datos[COL_NSE_CAT], categories=ORDEN_NSE, ordered=True)
 
     # tabla % por NSE
-    ct = (pd.crosstab(datos[COL_NSE_CAT], datos[COL_EXPOSICION], normalize="index") * 100).fillna(0)
+    ct = datos.groupby([COL_NSE_CAT, COL_EXPOSICION], observed=True)["n"].sum().unstack(fill_value=0)
+    ct = (ct.div(ct.sum(axis=1), axis=0) * 100).fillna(0)
     # asegurar columnas
     for col in ["si", "no"]:
         if col not in ct.columns: ct[col] = 0.0
@@ -62,43 +71,38 @@ def grafico_divergente_si_no_por_nse(df: pd.DataFrame):
 
 
 # ===== Gráfico 2: tendencia de exposición por cuantiles del puntaje_nse ===== #
-def grafico_box_puntaje_nse_por_exposicion(df: pd.DataFrame):
+def grafico_box_puntaje_nse_por_exposicion(conteos: pd.DataFrame, cajas: pd.DataFrame):
     """
     Boxplot de 'percentil NSE' por exposición con mediana etiquetada.
     - Grupos: Expuesto/a vs No expuesto/a (P8: Si/No → mapeo).
     - Eje Y: percentil NSE (0–100 por defecto).
+    `cajas`: resumen de cuantiles por grupo; `conteos`: filas por (grupo,
+    percentil), de donde sale la muestra por cuotas de los puntos.
     """
-    # Mapear P8 a etiquetas claras
-    serie_exp = (
-        df[COL_EXPOSICION].astype(str).str.strip().str.lower()
-        .map({"si": "Expuesto/a", "no": "No expuesto/a"})
-    )
-
-    datos = pd.DataFrame({
-        "grupo_exposicion": serie_exp,
-        COL_NSE_SCORE: pd.to_numeric(df[COL_NSE_SCORE], errors="coerce"),
-    }).dropna()
-
     orden = ["Expuesto/a", "No expuesto/a"]
-    datos = datos[datos["grupo_exposicion"].isin(orden)]
+    cajas = cajas.reindex([g for g in orden if g in cajas.index])
+    conteos = conteos[conteos["grupo_exposicion"].isin(orden)]
+    datos = resumenes.muestra_por_cuotas(conteos, "grupo_exposicion", COL_NSE_SCORE)
 
-    # Boxplot + puntos (jitter)
-    ax = sns.boxplot(
-        data=datos,
-        x="grupo_exposicion", y=COL_NSE_SCORE,
-        order=orden, width=0.5
+    # Boxplot (desde los cuantiles) + puntos (jitter)
+    fig, ax = plt.subplots()
+    ax.bxp(
+        cajas.reset_index().to_dict("records"),
+        positions=[orden.index(g) for g in cajas.index], widths=0.5,
+        patch_artist=True, boxprops={"facecolor": sns.desaturate("C0", 0.75), "edgecolor": "0.26"},
+        medianprops={"color": "0.26"}, whiskerprops={"color": "0.26"}, capprops={"color": "0.26"},
+        manage_ticks=False,
     )
     sns.stripplot(
         data=datos,
         x="grupo_exposicion", y=COL_NSE_SCORE,
-        order=orden, color="k", alpha=0.35, size=3, jitter=True
+        order=orden, color="k", alpha=0.35, size=3, jitter=True, ax=ax
     )
 
     # Medianas por grupo: marcador y etiqueta
-    medianas = datos.groupby("grupo_exposicion")[COL_NSE_SCORE].median()
     for i, cat in enumerate(orden):
-        if cat in medianas.index:
-            y = float(medianas.loc[cat])
+        if cat in cajas.index:
+            y = float(cajas.loc[cat, "med"])
             ax.scatter(i, y, marker="D", s=46, color="black", zorder=5)
             ax.annotate(f"{y:.1f}", (i, y), xytext=(0, 6),
                         textcoords="offset points", ha="center", va="bottom",
@@ -115,16 +119,84 @@ def grafico_box_puntaje_nse_por_exposicion(df: pd.DataFrame):
 
 
 # =============================== Main =============================== #
-def main():
-    df = pd.read_csv(RUTA_CSV)
+NOMBRES_FIGURAS = ["figura_5", "figura_6"]
+
+
+def resumir(df: pd.DataFrame) -> dict:
+    """
+    Tablas resumen de H2 (ver resumenes.py), de una sola pasada sobre `df`:
+    conteos por (P8 normalizada, NSE, percentil NSE) y de ahí
+      - 'p8_por_nse': conteos por (NSE, P8),
+      - 'percentil': conteos por (grupo de exposición, percentil NSE),
+      - 'cuantiles_percentil': cuartiles, bigotes, atípicos y media del
+        percentil NSE por grupo de exposición.
+    """
+    col_p8 = columna_por_prefijo(df.columns, PREGUNTA_EXPOSICION)
+    conjunta = resumenes.conteos(pd.DataFrame({
+        COL_EXPOSICION: df[col_p8].astype(str).str.strip().str.lower(),
+        COL_NSE_CAT: df[COL_NSE_CAT],
+        COL_NSE_SCORE: pd.to_numeric(df[COL_NSE_SCORE], errors="coerce"),
+    }), [COL_EXPOSICION, COL_NSE_CAT, COL_NSE_SCORE])
+
+    grupos = conjunta[COL_EXPOSICION].map({"si": "Expuesto/a", "no": "No expuesto/a"})
+    percentil = resumenes.marginal(
+        conjunta.assign(grupo_exposicion=grupos).dropna(subset=["grupo_exposicion", COL_NSE_SCORE]),
+        ["grupo_exposicion", COL_NSE_SCORE],
+    )
+
+    cajas = [
+        resumenes.estadisticas_caja(filas[COL_NSE_SCORE], filas["n"], etiqueta=grupo)
+        for grupo, filas in percentil.groupby("grupo_exposicion")
+    ]
+    return {
+        "p8_por_nse": resumenes.marginal(conjunta, [COL_NSE_CAT, COL_EXPOSICION]),
+        "percentil": percentil,
+        "cuantiles_percentil": pd.DataFrame(cajas, index=pd.Index([c["label"] for c in cajas], name="grupo_exposicion")),
+    }
+
+
+def figuras(resumen: dict) -> list:
+    """
+    Figuras 5 y 6 como [(nombre, función que la dibuja)], en orden. Cada función
+    lleva solo sus tablas resumen (lo que viaja a otro proceso).
+    """
+    funciones = [
+        partial(grafico_divergente_si_no_por_nse, resumen["p8_por_nse"]),
+        partial(grafico_box_puntaje_nse_por_exposicion, resumen["percentil"], resumen["cuantiles_percentil"]),
+    ]
+    return list(zip(NOMBRES_FIGURAS, funciones))
+
+
+def _preparar(df, ruta, resumen):
+    # Sin resúmenes ni `df`, lee de `ruta` solo las tres columnas que usan los gráficos
+    if resumen is not None:
+        return resumen
+    if df is None:
+        columnas = columnas_por_prefijo(leer_encabezado(ruta), [PREGUNTA_EXPOSICION, COL_NSE_CAT, COL_NSE_SCORE])
+        df = leer_intermedio(ruta, columnas)
+    return resumir(df)
+
+
+def guardar_figuras(df: pd.DataFrame = None, ruta: str = RUTA_CSV,
+                    directorio: str = graficos.DIRECTORIO_FIGURAS,
+                    formatos=graficos.FORMATOS_FIGURA, procesos: int = None, resumen: dict = None) -> list:
+    """
+    Modo batch (sin pantalla): escribe las Figuras 5 y 6 en `directorio` en
+    cada uno de `formatos` (con `procesos` > 1, una figura por proceso) y
+    devuelve las rutas de los archivos. Con `resumen` (de resumir()) no usa `df`.
+    """
+    return graficos.guardar(figuras(_preparar(df, ruta, resumen)), directorio, formatos, procesos)
+
 
-    # Gráfico 1
-    grafico_divergente_si_no_por_nse(df)
-    plt.show()
+def main(df: pd.DataFrame = None, ruta: str = RUTA_CSV, resumen: dict = None) -> dict:
+    # Dibuja desde las tablas resumen (`resumen`, o resumir(df); si no recibe
+    # el DataFrame con NSE lee de `ruta` solo las tres columnas que usan los
+    # gráficos). Devuelve las tablas resumen.
+    resumen = _preparar(df, ruta, resumen)
 
-    # Gráfico 2
-    grafico_box_puntaje_nse_por_exposicion(df)
-    plt.show()
+    # Gráficos 1 y 2 (Figuras 5 y 6)
+    graficos.mostrar(figuras(resumen))
+    return resumen
 
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+# instrumentacion.py
+"""
+Traza de dónde se va el tiempo y la memoria del pipeline.
+
+Las etapas de main.py y los pasos pesados (matching de ubicaciones, puntaje y
+percentiles de NSE, lectura/escritura del intermedio, cada figura) se envuelven
+en medir(). Cada medición agrega una línea JSON a la traza con:
+  - tiempo de reloj y de CPU (del proceso),
+  - memoria residente al terminar y pico del proceso (ru_maxrss), y cuánto
+    subió el pico durante la medición,
+  - bytes leídos y escritos (contadores de /proc/self/io, donde existen),
+  - filas de entrada y salida, cuando el paso las informa,
+  - proceso, hilo y medición que la contiene (`padre`).
+
+Apagada (lo normal) medir() no hace nada. Se activa con activar(ruta) o con la
+variable de entorno INSTRUMENTACION=ruta; los procesos de los pools heredan la
+variable y escriben en la misma traza (una línea por write, en modo append).
+a_chrome_trace() convierte la traza para chrome://tracing o Perfetto.
+
+Con perfil="cprofile" (o "pyinstrument", si está instalado) cada etapa se
+perfila además por separado, en `ruta`.perfiles/.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: sin ru_maxrss
+    resource = None
+
+PERFILES = ("cprofile", "pyinstrument")
+
+_RUTA = os.environ.get("INSTRUMENTACION") or None
+_PERFIL = os.environ.get("INSTRUMENTACION_PERFIL") or None
+_PILA = threading.local()
+
+
+def activar(ruta: str, perfil: str = None, vaciar: bool = True):
+    """
+    Empieza a registrar en `ruta` (JSON lines) en este proceso y en los que
+    lance después. Con `perfil` perfila cada etapa. `vaciar` borra la traza anterior.
+    """
+    global _RUTA, _PERFIL
+    if perfil is not None and perfil not in PERFILES:
+        raise ValueError(f"Perfil desconocido '{perfil}' (hay: {', '.join(PERFILES)})")
+    if perfil == "pyinstrument":
+        _requerir_pyinstrument()
+    ruta = os.path.abspath(ruta)
+    if vaciar and os.path.exists(ruta):
+        os.remove(ruta)
+    _RUTA, _PERFIL = ruta, perfil
+    os.environ["INSTRUMENTACION"] = ruta
+    if perfil:
+        os.environ["INSTRUMENTACION_PERFIL"] = perfil
+    else:
+        os.environ.pop("INSTRUMENTACION_PERFIL", None)
+
+
+def desactivar():
+    global _RUTA, _PERFIL
+    _RUTA = _PERFIL = None
+    os.environ.pop("INSTRUMENTACION", None)
+    os.environ.pop("INSTRUMENTACION_PERFIL", None)
+
+
+def activa() -> bool:
+    return _RUTA is not None
+
+
+def _requerir_pyinstrument():
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError as error:
+        raise ImportError("El perfil 'pyinstrument' requiere pyinstrument (pip install pyinstrument)") from error
+
+
+def filas(objeto):
+    """Filas de un DataFrame/Series (None para cualquier otra cosa)."""
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        return len(objeto)
+    return None
+
+
+def pico_memoria_mb(hijos: bool = False):
+    """
+    Pico de memoria residente (ru_maxrss) de este proceso, o del mayor de sus
+    hijos terminados, en MB. None donde no hay `resource` (Windows).
+    """
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_CHILDREN if hijos else resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB; macOS, en bytes
+    return maximo / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def cpu_hijos() -> float:
+    """Segundos de CPU (usuario + sistema) de los procesos hijos terminados (0 sin `resource`)."""
+    if resource is None:
+        return 0.0
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def _memoria_mb():
+    # (residente actual, pico del proceso) en MB; None si no se puede leer
+    actual = None
+    try:
+        with open("/proc/self/statm") as file:
+            actual = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    return actual, pico_memoria_mb()
+
+
+def _bytes_io():
+    # (leídos, escritos) por el proceso, incluida la cache de páginas (rchar/wchar)
+    try:
+        with open("/proc/self/io") as file:
+            campos = dict(linea.split(": ") for linea in file.read().splitlines())
+        return int(campos["rchar"]), int(campos["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _redondear(valor, decimales=1):
+    return None if valor is None else round(valor, decimales)
+
+
+def _escribir(registro):
+    # Una línea = un write en modo append: las de distintos procesos no se mezclan
+    linea = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+    with open(_RUTA, "a", encoding="utf-8") as file:
+        file.write(linea)
+
+
+def _pila():
+    if not hasattr(_PILA, "nombres"):
+        _PILA.nombres = []
+    return _PILA.nombres
+
+
+@contextmanager
+def _perfilando(nombre):
+    directorio = f"{_RUTA}.perfiles"
+    os.makedirs(directorio, exist_ok=True)
+    base = os.path.join(directorio, f"{nombre.replace(':', '_')}-{os.getpid()}")
+    if _PERFIL == "cprofile":
+        import cProfile
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+        try:
+            yield
+        finally:
+            perfilador.disable()
+            perfilador.dump_stats(f"{base}.prof")
+    else:
+        from pyinstrument import Profiler
+        perfilador = Profiler()
+        perfilador.start()
+        try:
+            yield
+        finally:
+            perfilador.stop()
+            with open(f"{base}.txt", "w", encoding="utf-8") as file:
+                file.write(perfilador.output_text())
+
+
+@contextmanager
+def medir(nombre: str, categoria: str = "paso", **atributos):
+    """
+    Mide el bloque `with` y lo registra como `nombre`. Devuelve un dict donde
+    el bloque puede anotar más datos (p. ej. medida["filas_salida"] = len(df)).
+    """
+    if _RUTA is None:
+        yield dict(atributos)
+        return
+
+    pila = _pila()
+    padre = pila[-1] if pila else None
+    pila.append(nombre)
+    medida = dict(atributos)
+    _, pico_inicial = _memoria_mb()
+    leidos, escritos = _bytes_io()
+    inicio_us = time.time_ns() // 1000
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    try:
+        if categoria == "etapa" and _PERFIL:
+            with _perfilando(nombre):
+                yield medida
+        else:
+            yield medida
+    except BaseException as error:
+        medida["error"] = type(error).__name__
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        cpu = time.process_time() - inicio_cpu
+        actual, pico = _memoria_mb()
+        leidos_fin, escritos_fin = _bytes_io()
+        pila.pop()
+        registro = {
+            "nombre": nombre,
+            "categoria": categoria,
+            "pid": os.getpid(),
+            "hilo": threading.get_ident(),
+            "padre": padre,
+            "inicio_us": inicio_us,
+            "duracion_us": int(segundos * 1e6),
+            "cpu_us": int(cpu * 1e6),
+            "rss_mb": _redondear(actual),
+            "rss_pico_mb": _redondear(pico),
+            "rss_pico_aumento_mb": _redondear(None if pico is None else pico - pico_inicial),
+            "bytes_leidos": None if leidos is None else leidos_fin - leidos,
+            "bytes_escritos": None if escritos is None else escritos_fin - escritos,
+        }
+        registro.update(medida)
+        _escribir(registro)
+
+
+def evento(nombre: str, categoria: str = "evento", **atributos):
+    """Registra un evento instantáneo (p. ej. una etapa salteada por la cache)."""
+    if _RUTA is None:
+        return
+    pila = _pila()
+    _escribir({
+        "nombre": nombre,
+        "categoria": categoria,
+        "pid": os.getpid(),
+        "hilo": threading.get_ident(),
+        "padre": pila[-1] if pila else None,
+        "inicio_us": time.time_ns() // 1000,
+        **atributos,
+    })
+
+
+def leer_traza(ruta: str) -> list:
+    with open(ruta, encoding="utf-8") as file:
+        return [json.loads(linea) for linea in file if linea.strip()]
+
+
+def a_chrome_trace(ruta: str, ruta_salida: str = None) -> str:
+    """
+    Convierte la traza `ruta` al formato de Chrome trace (JSON con traceEvents)
+    en `ruta_salida` (por defecto, la misma ruta con extensión .trace.json) y la devuelve.
+    """
+    if ruta_salida is None:
+        ruta_salida = os.path.splitext(ruta)[0] + ".trace.json"
+    eventos = []
+    for registro in leer_traza(ruta):
+        argumentos = {k: v for k, v in registro.items()
+                      if k not in ("nombre", "categoria", "pid", "hilo", "inicio_us", "duracion_us")}
+        evento_chrome = {
+            "name": registro["nombre"],
+            "cat": registro["categoria"],
+            "pid": registro["pid"],
+            "tid": registro["hilo"],
+            "ts": registro["inicio_us"],
+            "args": argumentos,
+        }
+        if "duracion_us" in registro:
+            evento_chrome.update(ph="X", dur=registro["duracion_us"])
+        else:
+            evento_chrome.update(ph="i", s="p")
+        eventos.append(evento_chrome)
+    with open(ruta_salida, "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, file, ensure_ascii=False)
+    return ruta_salida
@@ -1,26 +1,51 @@
 # limpieza.py
+import numpy as np
 import pandas as pd
+import sqlite3
 import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from rapidfuzz import process, fuzz
-from claves_busqueda import CLAVES_NORMALIZADAS, A_CANONICO
+from almacenamiento import (
+    ENCUESTA_CRUDA,
+    ENCUESTA_LIMPIA,
+    guardar_intermedio,
+    guardar_intermedio_por_bloques,
+    leer_encuesta_cruda,
+)
+from columnas import columna_por_prefijo, leer_encabezado, registro_preguntas
+from esquema import aplicar_esquema
+from instrumentacion import medir
+from paralelo import mapear_en_orden
+from claves_busqueda import CLAVES_NORMALIZADAS, A_CANONICO, candidatos_por_tokens
+from cache_ubicaciones import cache_ubicaciones, deshabilitar
+
+
+# Preguntas de la encuesta cruda que no usan las hipótesis (se descartan con la marca temporal)
+PREGUNTAS_NO_USADAS = (1, 2, 9, 10, 11, 12, 13, 14, 17, 18, 19)
+
+
+def columnas_no_usadas(columnas) -> list:
+    """Columnas de `columnas` que limpieza descarta, en el orden del encabezado."""
+    registro = registro_preguntas(columnas)
+    descartar = {"Marca temporal"} | {registro[n][1] for n in PREGUNTAS_NO_USADAS if n in registro}
+    return [col for col in columnas if col in descartar]
+
+
+def columnas_usadas(columnas) -> list:
+    """Las demás columnas de `columnas` (las únicas que hace falta leer de la encuesta cruda)."""
+    descartar = set(columnas_no_usadas(columnas))
+    return [col for col in columnas if col not in descartar]
+
+
+def leer_entrada(ruta: str = ENCUESTA_CRUDA, tamano_bloque: int = None):
+    """Encuesta cruda con solo las columnas que usa limpieza (ver leer_encuesta_cruda)."""
+    return leer_encuesta_cruda(ruta, tamano_bloque, columnas=columnas_usadas(leer_encabezado(ruta)))
 
 
 def eliminar_columas_no_usadas(df: pd.DataFrame) -> pd.DataFrame:
-    columnas_a_eliminar = [
-        "Marca temporal",
-        df.columns[df.columns.str.startswith("1")][0],
-        df.columns[df.columns.str.startswith("2")][0],
-        df.columns[df.columns.str.startswith("9")][0],
-        df.columns[df.columns.str.startswith("10")][0],
-        df.columns[df.columns.str.startswith("11")][0],
-        df.columns[df.columns.str.startswith("12")][0],
-        df.columns[df.columns.str.startswith("13")][0],
-        df.columns[df.columns.str.startswith("14")][0],
-        df.columns[df.columns.str.startswith("17")][0],
-        df.columns[df.columns.str.startswith("18")][0],
-        df.columns[df.columns.str.startswith("19")][0],
-    ]
-    return df.drop(columns=columnas_a_eliminar)
+    # Si `df` se leyó con leer_entrada() no queda nada para eliminar
+    return df.drop(columns=columnas_no_usadas(df.columns))
 
 
 def a_minusculas(s):
@@ -65,6 +90,182 @@ def detectar_partido_fuzzy(texto_norm, cutoff: int = 80) -> str:
     return A_CANONICO.get(variante, "otro")
 
 
+# --- Matching por lotes: todos los textos distintos contra todas las claves ---
+
+# Filas (textos distintos) por llamada a cdist: acota la matriz de puntajes
+# a TAMANO_BLOQUE_CDIST x len(CLAVES_NORMALIZADAS) floats.
+TAMANO_BLOQUE_CDIST = 20000
+
+# Núcleos que usa cdist por defecto (-1 = todos). Los procesos del pool de
+# `limpiar_por_bloques` lo bajan a 1 para no competir entre sí.
+WORKERS_CDIST = -1
+
+
+def detectar_partidos_lote(textos_norm, cutoff: int = 80, workers: int = None) -> list:
+    """
+    Versión por lotes de `detectar_partido_fuzzy`: puntúa todos los textos contra
+    todas las CLAVES_NORMALIZADAS con `process.cdist` (usando `workers` núcleos;
+    None = WORKERS_CDIST) y elige la mejor clave por fila.
+
+    Devuelve exactamente las mismas etiquetas que aplicar `detectar_partido_fuzzy`
+    elemento a elemento: misma semántica de `score_cutoff`, en empates gana la
+    primera clave (como extractOne) y 'otro' si ninguna supera el corte.
+    """
+    if workers is None:
+        workers = WORKERS_CDIST
+    etiquetas = ["otro"] * len(textos_norm)
+    posiciones, consultas = [], []
+    for i, texto in enumerate(textos_norm):
+        if pd.isna(texto) or str(texto).strip() == "":
+            continue
+        posiciones.append(i)
+        consultas.append(str(texto).strip())
+
+    for inicio in range(0, len(consultas), TAMANO_BLOQUE_CDIST):
+        bloque = consultas[inicio:inicio + TAMANO_BLOQUE_CDIST]
+        # float64 para no generar empates artificiales al redondear a float32
+        puntajes = process.cdist(
+            bloque,
+            CLAVES_NORMALIZADAS,
+            scorer=fuzz.token_set_ratio,
+            score_cutoff=cutoff,
+            dtype=np.float64,
+            workers=workers,
+        )
+        mejores = puntajes.argmax(axis=1)
+        mejores_puntajes = puntajes[np.arange(len(bloque)), mejores]
+        for k, (j, puntaje) in enumerate(zip(mejores, mejores_puntajes)):
+            if puntaje >= cutoff:
+                etiquetas[posiciones[inicio + k]] = A_CANONICO.get(CLAVES_NORMALIZADAS[j], "otro")
+
+    return etiquetas
+
+
+# --- Camino rápido: coincidencia exacta y luego índice de tokens ---
+
+def detectar_partido_indexado(texto_norm: str, cutoff: int = 80):
+    """
+    Intenta resolver `texto_norm` sin recorrer todas las claves:
+      1) coincidencia exacta con un alias (A_CANONICO);
+      2) token_set_ratio solo contra los alias que comparten algún token
+         (claves_busqueda.candidatos_por_tokens).
+    Devuelve la etiqueta canónica o None si hay que caer al fuzzy completo.
+
+    Nota: una coincidencia exacta gana siempre, aunque un alias anterior de la
+    lista también puntúe 100 por estar contenido en el texto.
+    """
+    if texto_norm in A_CANONICO:
+        return A_CANONICO[texto_norm]
+
+    candidatos = candidatos_por_tokens(texto_norm)
+    if not candidatos:
+        return None
+    match = process.extractOne(
+        texto_norm,
+        candidatos,
+        scorer=fuzz.token_set_ratio,
+        score_cutoff=cutoff,
+    )
+    if not match:
+        return None
+    return A_CANONICO.get(match[0], "otro")
+
+
+# --- Matching deduplicado: cada texto distinto se resuelve una sola vez ---
+
+# Tope de entradas de la cache (textos normalizados distintos). Es compartida
+# entre las columnas P3/P4 y entre corridas dentro del mismo proceso.
+TAMANO_CACHE_UBICACIONES = 65536
+
+# (texto_norm, cutoff) -> etiqueta, en orden de uso (LRU)
+_CACHE_UBICACIONES: "OrderedDict[tuple, str]" = OrderedDict()
+
+
+# Si además se usa la cache en disco (cache_ubicaciones.py), compartida entre
+# corridas y entre los procesos del pool
+USAR_CACHE_EN_DISCO = True
+
+
+def limpiar_cache_ubicaciones(en_disco: bool = False):
+    _CACHE_UBICACIONES.clear()
+    cache = cache_ubicaciones() if en_disco else None
+    if cache is not None:
+        cache.limpiar()
+
+
+def _buscar_en_disco(textos, cutoff) -> dict:
+    cache = cache_ubicaciones() if USAR_CACHE_EN_DISCO and textos else None
+    if cache is None:
+        return {}
+    try:
+        return cache.buscar(textos, cutoff)
+    except (sqlite3.Error, OSError) as error:
+        deshabilitar(error)
+        return {}
+
+
+def _guardar_en_disco(etiquetas, cutoff):
+    cache = cache_ubicaciones() if USAR_CACHE_EN_DISCO and etiquetas else None
+    if cache is None:
+        return
+    try:
+        cache.guardar(etiquetas, cutoff)
+    except (sqlite3.Error, OSError) as error:
+        deshabilitar(error)
+
+
+def clasificar_ubicaciones(serie: pd.Series, cutoff: int = 80) -> pd.Series:
+    """
+    Equivalente a `serie.apply(normalizar_basico).apply(detectar_partido_fuzzy)`,
+    pero normaliza cada respuesta distinta una sola vez y expande el resultado a
+    todas las filas con un map vectorizado. Los textos que no están en la cache
+    acotada se buscan en la cache en disco (cache_ubicaciones.py); los que
+    tampoco están ahí se resuelven primero por `detectar_partido_indexado` y
+    solo los que quedan sin resolver van al fuzzy completo en un único lote
+    (`detectar_partidos_lote`). Lo resuelto se guarda en las dos caches.
+    """
+    with medir("limpieza.ubicaciones", filas_entrada=len(serie), columna=str(serie.name)[:2]) as medida:
+        codigos, unicos = pd.factorize(serie)
+        normalizados = [str(normalizar_basico(valor)).strip() for valor in unicos]
+
+        faltantes = list(dict.fromkeys(
+            t for t in normalizados if t and (t, cutoff) not in _CACHE_UBICACIONES
+        ))
+        guardados = _buscar_en_disco(faltantes, cutoff)
+        nuevos, sin_resolver = {}, []
+        for texto in faltantes:
+            if texto in guardados:
+                _CACHE_UBICACIONES[(texto, cutoff)] = guardados[texto]
+                continue
+            etiqueta = detectar_partido_indexado(texto, cutoff)
+            if etiqueta is None:
+                sin_resolver.append(texto)
+            else:
+                nuevos[texto] = etiqueta
+        nuevos.update(zip(sin_resolver, detectar_partidos_lote(sin_resolver, cutoff)))
+        for texto, etiqueta in nuevos.items():
+            _CACHE_UBICACIONES[(texto, cutoff)] = etiqueta
+        _guardar_en_disco(nuevos, cutoff)
+        # Textos distintos, los que no estaban en memoria, los que salieron del disco y los que fueron al fuzzy completo
+        medida.update(textos_distintos=len(unicos), sin_cache=len(faltantes), en_disco=len(guardados),
+                      fuzzy=len(sin_resolver))
+
+    etiquetas = []
+    for t in normalizados:
+        if not t:
+            etiquetas.append("otro")
+            continue
+        _CACHE_UBICACIONES.move_to_end((t, cutoff))
+        etiquetas.append(_CACHE_UBICACIONES[(t, cutoff)])
+
+    while len(_CACHE_UBICACIONES) > TAMANO_CACHE_UBICACIONES:
+        _CACHE_UBICACIONES.popitem(last=False)
+
+    # Código -1 = NaN → 'otro' (igual que detectar_partido_fuzzy)
+    etiquetas.append("otro")
+    return pd.Series(np.asarray(etiquetas, dtype=object)[codigos], index=serie.index, name=serie.name)
+
+
 def normalizar_p6(valor):
     # De "Jubilado/a -> pase a pregunta 8" deja "Jubilado/a"
     return str(valor).split("->")[0].strip()
@@ -72,7 +273,7 @@ def normalizar_p6(valor):
 
 def corregir_p7(df, col_condicion_laboral, col_ocupacion):
     # Normaliza condicion_laboral y fuerza ocupacion = "No corresponde" cuando P6 != "Ocupado"
-    df[col_condicion_laboral] = df[col_condicion_laboral].apply(normalizar_p6)
+    df[col_condicion_laboral] = normalizar_p6_vectorizado(df[col_condicion_laboral])
     mask = df[col_condicion_laboral] != "Ocupado"
     df.loc[mask, col_ocupacion] = "No corresponde"
     return df
@@ -105,40 +306,133 @@ def normalizar_p20(valor):
     return "otro"
 
 
-def main():
-    # Lee el CSV original
-    df = pd.read_csv("Encuesta.csv")
+# --- Versiones vectorizadas de los normalizadores ---
+# Las respuestas se repiten mucho: cada función fila a fila de arriba (que queda
+# como implementación de referencia) se evalúa una sola vez por valor distinto
+# y el resultado se expande con los códigos de pd.factorize. Mismas salidas,
+# incluidos NaN y los 'otro' (un None se trata como NaN, como en read_csv).
+
+def _aplicar_por_unicos(serie: pd.Series, funcion) -> pd.Series:
+    codigos, unicos = pd.factorize(serie)
+    resultados = [funcion(valor) for valor in unicos]
+    resultados.append(funcion(np.nan))  # código -1 = NaN
+    valores = np.empty(len(resultados), dtype=object)
+    valores[:] = resultados
+    return pd.Series(valores[codigos], index=serie.index, name=serie.name)
+
+
+def a_minusculas_vectorizado(serie: pd.Series) -> pd.Series:
+    return _aplicar_por_unicos(serie, a_minusculas)
+
+
+def quitar_tildes_vectorizado(serie: pd.Series) -> pd.Series:
+    return _aplicar_por_unicos(serie, quitar_tildes)
+
+
+def normalizar_p6_vectorizado(serie: pd.Series) -> pd.Series:
+    return _aplicar_por_unicos(serie, normalizar_p6)
+
+
+def normalizar_p8_vectorizado(serie: pd.Series) -> pd.Series:
+    return _aplicar_por_unicos(serie, normalizar_p8)
+
+
+def normalizar_p20_vectorizado(serie: pd.Series) -> pd.Series:
+    return _aplicar_por_unicos(serie, normalizar_p20)
+
 
+def limpiar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica todas las transformaciones de limpieza. Son todas fila a fila, así que
+    da lo mismo aplicarla a la encuesta completa o a bloques de filas.
+    """
     # Limpia columnas que no usaremos para las hipótesis
     df = eliminar_columas_no_usadas(df)
 
     # Nombres de columnas a sobrescribir (prefijos según tu formulario)
-    col_residencia = df.columns[df.columns.str.startswith("3")][0]
-    col_barrio = df.columns[df.columns.str.startswith("4")][0]
-    col_condicion_laboral = df.columns[df.columns.str.startswith("6")][0]
-    col_ocupacion = df.columns[df.columns.str.startswith("7")][0]
-    col_conoce_casos = df.columns[df.columns.str.startswith("8")][0]
+    col_residencia = columna_por_prefijo(df.columns, "3")
+    col_barrio = columna_por_prefijo(df.columns, "4")
+    col_condicion_laboral = columna_por_prefijo(df.columns, "6")
+    col_ocupacion = columna_por_prefijo(df.columns, "7")
+    col_conoce_casos = columna_por_prefijo(df.columns, "8")
 
     # Normaliza y clasifica residencia/barrio a PARTIDO canónico (o 'otro')
-    df[col_residencia] = df[col_residencia].apply(normalizar_basico).apply(detectar_partido_fuzzy)
-    df[col_barrio] = df[col_barrio].apply(normalizar_basico).apply(detectar_partido_fuzzy)
+    df[col_residencia] = clasificar_ubicaciones(df[col_residencia])
+    df[col_barrio] = clasificar_ubicaciones(df[col_barrio])
 
     # Regla de salto: solo "Ocupado" puede tener P7; el resto "No corresponde"
     df = corregir_p7(df, col_condicion_laboral, col_ocupacion)
 
     # Corregir la pregunta 8
-    df[col_conoce_casos] = df[col_conoce_casos].apply(normalizar_p8)
+    df[col_conoce_casos] = normalizar_p8_vectorizado(df[col_conoce_casos])
 
     # Renombrar y normalizar la P20 (impunidad en el sistema judicial)
-    col_p20_old = df.columns[df.columns.str.startswith("20")][0]
+    col_p20_old = columna_por_prefijo(df.columns, "20")
     col_p20_new = "20 - ¿Considera que los casos de abuso y violencia policial quedan impunes en el sistema judicial?"
     df.rename(columns={col_p20_old: col_p20_new}, inplace=True)
-    df[col_p20_new] = df[col_p20_new].apply(normalizar_p20)
+    df[col_p20_new] = normalizar_p20_vectorizado(df[col_p20_new])
+
+    # Tipos compactos del intermedio (categóricas; P15 y P16 a entero Int8): ver esquema.py
+    return aplicar_esquema(df)
+
+
+def _inicializar_proceso():
+    # Corre una vez por proceso del pool: importar este módulo ya construyó las
+    # estructuras de claves_busqueda (y la cache de ubicaciones vive mientras
+    # viva el proceso, entre bloques). cdist con un solo núcleo por proceso.
+    global WORKERS_CDIST
+    WORKERS_CDIST = 1
 
-    # Guarda el CSV resultante
-    df.to_csv("Encuesta_limpia.csv", index=False)
 
+def limpiar_por_bloques(ruta_entrada: str = ENCUESTA_CRUDA, ruta_salida: str = ENCUESTA_LIMPIA,
+                        tamano_bloque: int = 100_000, procesos: int = None) -> int:
+    """
+    Modo streaming: lee `ruta_entrada` de a `tamano_bloque` filas, limpia cada
+    bloque y lo agrega a `ruta_salida`, con memoria constante. El archivo
+    resultante es idéntico (byte a byte) al de `main()` sin bloques.
+
+    Con `procesos` > 1 los bloques se limpian en paralelo en un ProcessPoolExecutor
+    y se escriben en el orden original (hasta 2 bloques en vuelo por proceso).
+    Devuelve la cantidad de filas escritas.
+    """
+    bloques = leer_entrada(ruta_entrada, tamano_bloque=tamano_bloque)
+    if not procesos or procesos <= 1:
+        return guardar_intermedio_por_bloques((limpiar(bloque) for bloque in bloques), ruta_salida)
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso) as executor:
+        limpios = mapear_en_orden(executor, limpiar, bloques, max_pendientes=2 * procesos)
+        return guardar_intermedio_por_bloques(limpios, ruta_salida)
+
+
+def main(df: pd.DataFrame = None, guardar: bool = True, ruta_salida: str = ENCUESTA_LIMPIA,
+         tamano_bloque: int = None, procesos: int = None) -> pd.DataFrame:
+    """
+    Limpia la encuesta cruda y devuelve el DataFrame resultante.
+    Si `df` es None lee Encuesta.csv; si `guardar` es False no escribe
+    `ruta_salida` (útil cuando el orquestador pasa el DataFrame en memoria).
+    El formato de salida (CSV/Parquet/Feather) sale de la extensión de `ruta_salida`.
+
+    Con `tamano_bloque` procesa Encuesta.csv en streaming (ver `limpiar_por_bloques`,
+    en paralelo si `procesos` > 1) y no devuelve nada: la encuesta completa nunca
+    está en memoria.
+    """
+    if tamano_bloque is not None:
+        if df is not None:
+            raise ValueError("El modo por bloques lee Encuesta.csv: no recibe un DataFrame")
+        limpiar_por_bloques(ENCUESTA_CRUDA, ruta_salida, tamano_bloque, procesos)
+        return None
+
+    # Lee el CSV original (solo las columnas que se usan)
+    if df is None:
+        df = leer_entrada(ENCUESTA_CRUDA)
+
+    df = limpiar(df)
+
+    # Guarda el archivo resultante
+    if guardar:
+        guardar_intermedio(df, ruta_salida)
+    return df
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
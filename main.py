@@ -1,27 +1,122 @@
 # main.py
+from functools import partial
+
 import tablas
 import limpieza
 import nse
 import hipotesis_1 as h1
 import hipotesis_2 as h2
 
+import etapas
+import graficos
+import instrumentacion
+from almacenamiento import ENCUESTA_CRUDA, ENCUESTA_LIMPIA
+
+TAMANO_BLOQUE_TABLAS = 100_000
+
+
+def _mostrar(modulo_main, resumen):
+    # Los gráficos son el resultado: etapa sin persistir, corre en cada ejecución
+    modulo_main(resumen=resumen)
+
+
+def _guardar(modulo_guardar_figuras, resumen, **opciones):
+    return modulo_guardar_figuras(resumen=resumen, **opciones)
+
+
+def _etapas_hipotesis(directorio_figuras, formatos_figuras, procesos_figuras):
+    # Primero las tablas resumen de cada hipótesis (etapas resumen_h1/resumen_h2,
+    # cacheadas como cualquier etapa) y los gráficos se dibujan desde ellas.
+    # Sin directorio: ventanas interactivas (plt.show()). Con directorio: modo
+    # batch sin pantalla; las figuras son las salidas declaradas de la etapa.
+    comunes = ["almacenamiento", "columnas", "esquema", "graficos", "resumenes"]
+    definicion = []
+    for nombre, modulo, dependencia, resumen in [
+        ("hipotesis_1", h1, "limpieza", "resumen_h1"),
+        ("hipotesis_2", h2, "nse", "resumen_h2"),
+    ]:
+        definicion.append(etapas.Etapa(resumen, modulo.resumir, dependencias=[dependencia],
+                                       modulos=[nombre] + comunes))
+        if directorio_figuras is None:
+            definicion.append(etapas.Etapa(nombre, partial(_mostrar, modulo.main), dependencias=[resumen],
+                                           modulos=[nombre] + comunes, persistir=False))
+            continue
 
-def main():
-    print("▶ Tablas…")
-    tablas.main()
+        definicion.append(etapas.Etapa(
+            nombre,
+            partial(_guardar, modulo.guardar_figuras, directorio=directorio_figuras, formatos=formatos_figuras,
+                    procesos=procesos_figuras),
+            dependencias=[resumen], modulos=[nombre] + comunes,
+            parametros={"directorio": directorio_figuras, "formatos": tuple(formatos_figuras)},
+            salidas=graficos.rutas_figuras(modulo.NOMBRES_FIGURAS, directorio_figuras, formatos_figuras),
+        ))
+    return definicion
 
-    print("▶ Limpieza…")
-    limpieza.main()
 
-    print("▶ Nivel Socioeconómico…")
-    nse.main()
+def definir_etapas(guardar_intermedios: bool = True, ruta_intermedio: str = ENCUESTA_LIMPIA,
+                   directorio_figuras: str = None, formatos_figuras=graficos.FORMATOS_FIGURA,
+                   procesos_figuras: int = None) -> list:
+    # DAG del pipeline: tablas; cruda → limpieza → nse → resumen_h2 → h2;
+    # limpieza → resumen_h1 → h1.
+    # h1 usa solo columnas de limpieza, así que un cambio en config_nse.json
+    # vuelve a correr nse y h2 (no el fuzzy matching de ubicaciones ni h1).
+    comunes = ["almacenamiento", "archivos", "columnas", "esquema"]
+    parametros = {"guardar": guardar_intermedios, "ruta": ruta_intermedio}
+    return [
+        # Solo las columnas que usa limpieza (las demás preguntas no se parsean)
+        etapas.Etapa("cruda", partial(limpieza.leer_entrada, ENCUESTA_CRUDA),
+                     archivos=[ENCUESTA_CRUDA], modulos=["almacenamiento", "columnas", "limpieza"], persistir=False),
+        # tablas lee por su cuenta solo género y edad, por bloques (memoria acotada)
+        etapas.Etapa("tablas", partial(tablas.main, tamano_bloque=TAMANO_BLOQUE_TABLAS),
+                     archivos=[ENCUESTA_CRUDA], modulos=["tablas"] + comunes,
+                     salidas=["tabla_genero.html", "tabla_edad.html"]),
+        etapas.Etapa("limpieza", partial(limpieza.main, guardar=guardar_intermedios, ruta_salida=ruta_intermedio),
+                     dependencias=["cruda"], modulos=["limpieza", "claves_busqueda", "cache_ubicaciones", "paralelo"] + comunes,
+                     parametros=parametros),
+        etapas.Etapa("nse", partial(nse.main, guardar=guardar_intermedios, ruta_salida=ruta_intermedio),
+                     dependencias=["limpieza"], archivos=[nse.CONFIG_PUNTAJE],
+                     modulos=["nse", "configuracion_nse", "paralelo"] + comunes,
+                     salidas=[ruta_intermedio] if guardar_intermedios else [], parametros=parametros),
+    ] + _etapas_hipotesis(directorio_figuras, formatos_figuras, procesos_figuras)
 
-    print("▶ Hipótesis 1…")
-    h1.main()
 
-    print("▶ Hipótesis 2…")
-    h2.main()
+def main(guardar_intermedios: bool = True, ruta_intermedio: str = ENCUESTA_LIMPIA,
+         usar_cache: bool = True, forzar=(), procesos: int = None,
+         directorio_figuras: str = None, formatos_figuras=graficos.FORMATOS_FIGURA,
+         procesos_figuras: int = None, traza: str = None, formato_traza: str = "jsonl",
+         perfil: str = None):
+    # La encuesta cruda (sus columnas útiles) se parsea una sola vez, para limpieza (y solo si
+    # tiene que correr); tablas lee solo sus dos columnas por bloques. Cada etapa recibe el resultado en memoria de las que
+    # dependen. Las etapas cuyas entradas (archivos, código, parámetros y
+    # resultados previos) no cambiaron se saltean y su resultado sale de la
+    # cache (ver etapas.py). `forzar` es una lista de etapas a correr igual.
+    # `guardar_intermedios` controla si además se escribe el archivo intermedio
+    # como checkpoint (limpieza y NSE), en el formato que indique la extensión
+    # de `ruta_intermedio` (.csv/.parquet/.feather).
+    # Con `procesos` > 1 las etapas independientes (tablas y limpieza; h1 y
+    # nse/h2) corren a la vez; el log de cada etapa sale igual en orden.
+    # Con `directorio_figuras` las Figuras 1–6 se escriben ahí (en cada formato
+    # de `formatos_figuras`) sin abrir ventanas, p. ej. en un servidor sin display;
+    # con `procesos_figuras` > 1 cada figura se dibuja en su propio proceso.
+    # Con `traza` se registra tiempo, CPU, memoria, filas y bytes de cada etapa
+    # y de sus pasos pesados en ese archivo (JSON lines; con formato_traza="chrome"
+    # además se convierte para chrome://tracing). `perfil` ("cprofile" o
+    # "pyinstrument") perfila cada etapa (ver instrumentacion.py).
+    if formato_traza not in ("jsonl", "chrome"):
+        raise ValueError(f"formato_traza debe ser 'jsonl' o 'chrome', no '{formato_traza}'")
+    if traza is not None:
+        instrumentacion.activar(traza, perfil)
 
+    definicion = definir_etapas(guardar_intermedios, ruta_intermedio,
+                                directorio_figuras, formatos_figuras, procesos_figuras)
+    try:
+        with instrumentacion.medir("pipeline", categoria="pipeline"):
+            etapas.ejecutar(definicion, usar_cache=usar_cache, forzar=forzar, procesos=procesos)
+    finally:
+        if traza is not None:
+            instrumentacion.desactivar()
+            if formato_traza == "chrome":
+                print(f"Traza: {instrumentacion.a_chrome_trace(traza)}")
     print("✅ Listo.")
 
 if __name__ == "__main__":
@@ -1,22 +1,57 @@
 import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 import pandas as pd
 
-df = pd.read_csv("Encuesta.csv")
+import almacenamiento
+from columnas import columna, columna_por_prefijo
+from configuracion_nse import cargar_configuracion_compilada
+from esquema import ORDEN_NSE, aplicar_esquema
+from instrumentacion import medir
+from paralelo import mapear_en_orden
 
-# Rutas de entrada/salida
-ENCUESTA_LIMPIA = "Encuesta_limpia.csv"
+# Rutas de entrada/salida (CSV, Parquet o Feather según la extensión)
+ENCUESTA_LIMPIA = almacenamiento.ENCUESTA_LIMPIA
 CONFIG_PUNTAJE = "config_nse.json"
-ENCUESTA_CON_NSE = "Encuesta_limpia.csv" # Para que sobreescriba el archivo
+ENCUESTA_CON_NSE = ENCUESTA_LIMPIA # Para que sobreescriba el archivo
+ESTADO_NSE = "nse_distribucion.npz" # Distribución persistida para el modo incremental
 
-# Columnas fuente
-COLUMNA_BARRIO = df.columns[df.columns.str.startswith("4")][0]
-COLUMNA_EDUCACION = df.columns[df.columns.str.startswith("5")][0]
-COLUMNA_OCUPACION = df.columns[df.columns.str.startswith("6")][0]
-COLUMNA_TRABAJO = df.columns[df.columns.str.startswith("7")][0]
+# Columnas fuente (prefijo de la pregunta). Se resuelven recién cuando se usan:
+# contra el DataFrame en main(), o contra el encabezado de Encuesta.csv si se
+# accede a nse.COLUMNA_BARRIO etc. (ver __getattr__), sin parsear el archivo.
+PREFIJOS_COLUMNAS = {
+    "COLUMNA_BARRIO": "4",
+    "COLUMNA_EDUCACION": "5",
+    "COLUMNA_OCUPACION": "6",
+    "COLUMNA_TRABAJO": "7",
+}
 
 COLUMNA_SALIDA_NSE = "nivel socioeconómico"
 COLUMNA_PERCENTIL_NSE = "percentil NSE"
 
+# Componente → (columna fuente, tabla de puntajes en config_nse.json).
+# El orden es el mismo en que combinar_componentes_normalizados suma los aportes.
+COMPONENTES_NSE = {
+    "barrio":    ("COLUMNA_BARRIO",    "puntajes_barrio"),
+    "educacion": ("COLUMNA_EDUCACION", "puntajes_educacion"),
+    "trabajo":   ("COLUMNA_TRABAJO",   "puntajes_trabajo"),
+    "ocupacion": ("COLUMNA_OCUPACION", "puntajes_ocupacion"),
+}
+
+# Límites superiores (inclusive) de cada banda de categorizar_por_percentil
+CORTES_PERCENTIL = np.array([20.0, 40.0, 60.0, 80.0])
+NIVELES_NSE = np.array(ORDEN_NSE, dtype=object)
+TIPO_NSE = pd.CategoricalDtype(ORDEN_NSE, ordered=True)
+
+def __getattr__(nombre):
+    if nombre in PREFIJOS_COLUMNAS:
+        return columna(PREFIJOS_COLUMNAS[nombre])
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 def cargar_configuracion(ruta_config):
     with open(ruta_config, "r", encoding="utf-8") as file:
         config = json.load(file)
@@ -76,38 +111,416 @@ def categorizar_por_percentil(porcentaje):
         return "Alto"
 
 
-def main():
-    df = pd.read_csv(ENCUESTA_LIMPIA)
-    config = cargar_configuracion(CONFIG_PUNTAJE)
+# ==================== Motor vectorizado (arrays de NumPy) ==================== #
+# Mismo cálculo que las funciones de arriba (que quedan como referencia), pero:
+#   - cada componente se codifica como entero (posición de la categoría en la
+#     tabla del JSON; -1 si no está) y el puntaje sale de indexar un array;
+#   - la normalización min–max se hace sobre la tabla, no fila a fila;
+#   - el compuesto es un producto matriz-vector (filas x componentes)·pesos;
+#   - el percentil es un rank promedio con np.unique y las bandas, np.searchsorted.
+# Da bit a bit los mismos percentiles y niveles que el cálculo con Series.
+#
+# Reciben `config` ya compilado (configuracion_nse.ConfiguracionNSE): tipos
+# categóricos, tablas de puntajes y pesos como arrays, validados una sola vez.
+
+def rango_observado(codigos, tabla):
+    """
+    (mínimo, máximo) de los puntajes de `tabla` (array con NaN al final para el
+    código -1) presentes en `codigos`; (nan, nan) si no hay ninguno.
+    """
+    observados = tabla[np.unique(codigos)]
+    observados = observados[~np.isnan(observados)]
+    if len(observados) == 0:
+        return (np.nan, np.nan)
+    return (float(observados.min()), float(observados.max()))
+
+
+def puntajes_normalizados_por_categoria(codigos, config, componente, rango_min_max=None):
+    """
+    Array con el puntaje min–max [0, 1] de cada categoría de `componente` (más un
+    NaN al final para el código -1), usando el mínimo y máximo observados en
+    `codigos` como normalizar_minmax_0_1 (o los de `rango_min_max`, si se pasa).
+    """
+    if rango_min_max is None:
+        rango_min_max = rango_observado(codigos, config.tabla(componente))
+    return config.puntajes_normalizados(componente, rango_min_max)
+
+
+def rangos_componentes(df, config, col):
+    """Mínimo y máximo observados de cada componente: {componente: (min, max)}."""
+    rangos = {}
+    for componente, (nombre_columna, _) in COMPONENTES_NSE.items():
+        codigos = config.codificar(componente, df[col[nombre_columna]])
+        rangos[componente] = rango_observado(codigos, config.tabla(componente))
+    return rangos
+
+
+def categorias_sin_mapeo(df, config, col):
+    """{componente: [valores sin puntaje en config_nse.json]} (solo componentes con faltantes)."""
+    faltantes = {}
+    for componente, (nombre_columna, _) in COMPONENTES_NSE.items():
+        valores = config.sin_mapeo(componente, df[col[nombre_columna]])
+        if valores:
+            faltantes[componente] = valores
+    return faltantes
+
+
+def advertir_categorias_sin_mapeo(df, config, col):
+    # Esas filas quedan sin puntaje en el componente (y sin NSE): mejor avisar antes de calcular
+    for componente, valores in categorias_sin_mapeo(df, config, col).items():
+        warnings.warn(
+            f"NSE: {len(valores)} categoría(s) de '{componente}' sin puntaje en {CONFIG_PUNTAJE}: {valores[:10]}",
+            stacklevel=2,
+        )
+
+
+def puntaje_compuesto_vectorizado(df, config, col, rangos=None):
+    """
+    Puntaje compuesto 0–1 (promedio ponderado de componentes normalizados) como array.
+    Con `rangos` ({componente: (min, max)}) normaliza con esos extremos en lugar
+    de los observados en `df` (lo usa el modo incremental).
+    """
+    matriz = np.empty((len(df), len(config.ponderados)))
+    for j, componente in enumerate(config.ponderados):
+        nombre_columna = COMPONENTES_NSE[componente][0]
+        codigos = config.codificar(componente, df[col[nombre_columna]])
+        rango_min_max = rangos[componente] if rangos is not None else None
+        matriz[:, j] = puntajes_normalizados_por_categoria(codigos, config, componente, rango_min_max)[codigos]
+
+    return _combinar_matriz(matriz, config)
+
+
+def _combinar_matriz(matriz, config):
+    # Promedio ponderado por fila de la matriz (filas x componentes ponderados).
+    # (matriz * pesos).sum(axis=1) y no matriz @ pesos: BLAS puede reordenar las
+    # sumas o usar FMA y cambiar el último bit, lo que rompería empates del rank.
+    # Por lo mismo se divide por suma_pesos y no se usan los pesos normalizados.
+    return (matriz * config.pesos).sum(axis=1) / config.suma_pesos
+
+
+def percentil_promedio(valores):
+    """Equivalente a Series(valores).rank(method="average", pct=True) * 100 (NaN se mantiene)."""
+    percentil = np.full(len(valores), np.nan)
+    validos = ~np.isnan(valores)
+    n = int(validos.sum())
+    if n == 0:
+        return percentil
+
+    _, inverso, conteos = np.unique(valores[validos], return_inverse=True, return_counts=True)
+    inicio = np.cumsum(conteos) - conteos
+    rango_promedio = inicio + (conteos + 1) / 2.0
+    percentil[validos] = rango_promedio[inverso] / n * 100.0
+    return percentil
+
+
+def codigos_por_percentil(percentil):
+    """
+    Índice en NIVELES_NSE de cada percentil de un array: el nivel que da
+    categorizar_por_percentil (NaN → 'Alto', igual que la original).
+    """
+    return np.searchsorted(CORTES_PERCENTIL, percentil, side="left")
+
+
+def calcular_nse_referencia(df, config, col):
+    """Cálculo original con Series (`config` es el dict del JSON): percentil 0–100 sin redondear."""
+    comp = {}
+    for componente, (nombre_columna, clave_tabla) in COMPONENTES_NSE.items():
+        crudo = puntuar_serie_desde_mapeo(df[col[nombre_columna]], config[clave_tabla])
+        comp[componente] = normalizar_minmax_0_1(crudo)
+
+    puntaje_compuesto_0_1 = combinar_componentes_normalizados(comp, config["pesos"], index=df.index)
+    return puntaje_compuesto_0_1.rank(method="average", pct=True) * 100.0
+
+
+# ======================= Modo incremental ======================= #
+# Para agregar respuestas nuevas sin volver a rankear todo: se persiste la
+# distribución ordenada de puntajes compuestos (valores distintos + conteos).
+# El percentil promedio de un puntaje x es
+#     (#menores que x + (#iguales a x + 1) / 2) / n * 100,
+# que sale de una búsqueda binaria sobre los conteos acumulados. Como el
+# compuesto depende de pocas combinaciones de categorías, la distribución
+# tiene a lo sumo unos cientos de valores aunque haya millones de filas.
+#
+# La normalización min–max depende de los extremos observados: si las filas
+# nuevas los amplían (o cambia config_nse.json), cambian todos los puntajes y
+# se recalcula todo desde cero (la firma es el hash de config_nse.json).
+
+class DistribucionNSE:
+    """Distribución ordenada de puntajes compuestos, con conteos por valor distinto."""
+
+    __slots__ = ("valores", "conteos", "rangos", "firma")
+
+    def __init__(self, valores, conteos, rangos, firma):
+        self.valores = np.asarray(valores, dtype=float)
+        self.conteos = np.asarray(conteos, dtype=np.int64)
+        self.rangos = rangos
+        self.firma = firma
+
+    @classmethod
+    def desde_puntajes(cls, puntajes, rangos, firma):
+        valores, conteos = np.unique(puntajes[~np.isnan(puntajes)], return_counts=True)
+        return cls(valores, conteos, rangos, firma)
+
+    @property
+    def total(self):
+        return int(self.conteos.sum())
+
+    def agregar(self, puntajes):
+        """Inserta puntajes nuevos (NaN se ignoran, como en rank)."""
+        nuevos, conteos_nuevos = np.unique(puntajes[~np.isnan(puntajes)], return_counts=True)
+        valores = np.union1d(self.valores, nuevos)
+        conteos = np.zeros(len(valores), dtype=np.int64)
+        conteos[np.searchsorted(valores, self.valores)] += self.conteos
+        conteos[np.searchsorted(valores, nuevos)] += conteos_nuevos
+        self.valores, self.conteos = valores, conteos
+
+    def percentiles(self, puntajes):
+        """Percentil promedio 0–100 de cada puntaje (que debe estar en la distribución)."""
+        percentil = np.full(len(puntajes), np.nan)
+        validos = ~np.isnan(puntajes)
+        posiciones = np.searchsorted(self.valores, puntajes[validos])
+        menores = (np.cumsum(self.conteos) - self.conteos)[posiciones]
+        rango_promedio = menores + (self.conteos[posiciones] + 1) / 2.0
+        percentil[validos] = rango_promedio / self.total * 100.0
+        return percentil
+
+    def admite(self, rangos, firma):
+        """True si filas con estos `rangos` se pueden sumar sin cambiar la normalización."""
+        if firma != self.firma:
+            return False
+        for componente, (minimo, maximo) in rangos.items():
+            actual_min, actual_max = self.rangos[componente]
+            if np.isnan(minimo):
+                continue
+            if np.isnan(actual_min) or minimo < actual_min or maximo > actual_max:
+                return False
+        return True
+
+    def guardar(self, ruta=ESTADO_NSE):
+        componentes = list(self.rangos)
+        np.savez(
+            ruta,
+            valores=self.valores,
+            conteos=self.conteos,
+            componentes=np.array(componentes),
+            rangos=np.array([self.rangos[c] for c in componentes], dtype=float),
+            firma=np.array(self.firma),
+        )
+
+    @classmethod
+    def cargar(cls, ruta=ESTADO_NSE):
+        with np.load(ruta) as datos:
+            rangos = {str(c): tuple(float(v) for v in r) for c, r in zip(datos["componentes"], datos["rangos"])}
+            return cls(datos["valores"], datos["conteos"], rangos, str(datos["firma"]))
+
+
+def _asignar_nse(df, percentil):
+    # float32 y categórica ordenada (ver esquema.py); en el archivo se escriben igual
+    df[COLUMNA_PERCENTIL_NSE] = np.round(percentil).astype(np.float32)
+    df[COLUMNA_SALIDA_NSE] = pd.Categorical.from_codes(codigos_por_percentil(percentil), dtype=TIPO_NSE)
+
+
+def verificar_incremental(puntajes, distribucion):
+    """
+    Verifica que los percentiles de `distribucion` coincidan con el rank completo
+    (Series.rank(method="average", pct=True) * 100) de `puntajes`. Lanza
+    AssertionError si no coinciden.
+    """
+    esperado = pd.Series(puntajes).rank(method="average", pct=True).to_numpy() * 100.0
+    obtenido = distribucion.percentiles(puntajes)
+    if not np.array_equal(esperado, obtenido, equal_nan=True):
+        diferencias = int((~np.isclose(esperado, obtenido, equal_nan=True)).sum())
+        raise AssertionError(f"Percentiles incrementales distintos del rank completo en {diferencias} filas")
+
+
+def actualizar_incremental(df_nuevos, ruta=ENCUESTA_CON_NSE, ruta_estado=ESTADO_NSE,
+                           verificar=False, guardar=True):
+    """
+    Agrega `df_nuevos` (respuestas ya limpias) a la encuesta con NSE en `ruta`.
+
+    Si existe la distribución persistida en `ruta_estado` y las filas nuevas no
+    cambian la normalización, solo se insertan sus puntajes en la distribución y
+    se reasignan los percentiles por búsqueda binaria (sin ordenar de nuevo).
+    Si no, recalcula todo como main(). Con `verificar` compara contra el rank
+    completo. Devuelve el DataFrame total.
+    """
+    config = cargar_configuracion_compilada(CONFIG_PUNTAJE)
+    firma = config.firma
+    df_existente = almacenamiento.leer_intermedio(ruta) if os.path.exists(ruta) else df_nuevos.iloc[:0]
+    df = aplicar_esquema(pd.concat([df_existente, df_nuevos], ignore_index=True))
+    col = {nombre: columna_por_prefijo(df.columns, prefijo) for nombre, prefijo in PREFIJOS_COLUMNAS.items()}
+
+    distribucion = DistribucionNSE.cargar(ruta_estado) if os.path.exists(ruta_estado) else None
+    rangos_nuevos = rangos_componentes(df_nuevos, config, col)
+    # La distribución tiene que corresponder a las filas que ya están en `ruta`
+    filas_con_percentil = int(df_existente[COLUMNA_PERCENTIL_NSE].notna().sum()) if COLUMNA_PERCENTIL_NSE in df_existente else 0
+    incremental = (
+        distribucion is not None
+        and distribucion.total == filas_con_percentil
+        and distribucion.admite(rangos_nuevos, firma)
+    )
+
+    if incremental:
+        puntajes = puntaje_compuesto_vectorizado(df, config, col, distribucion.rangos)
+        distribucion.agregar(puntajes[len(df_existente):])
+    else:
+        rangos = rangos_componentes(df, config, col)
+        puntajes = puntaje_compuesto_vectorizado(df, config, col, rangos)
+        distribucion = DistribucionNSE.desde_puntajes(puntajes, rangos, firma)
+
+    if verificar:
+        verificar_incremental(puntajes, distribucion)
+
+    _asignar_nse(df, distribucion.percentiles(puntajes))
+    if guardar:
+        almacenamiento.guardar_intermedio(df, ruta)
+        distribucion.guardar(ruta_estado)
+    return df
+
+
+# ================ Modo por bloques (percentiles en streaming) ================ #
+# Para encuestas que no entran en memoria: una pasada arma un boceto (sketch)
+# de la distribución del compuesto y una segunda asigna percentil y nivel.
+#
+# El compuesto es función solo de la combinación de categorías de los cuatro
+# componentes, así que el boceto cuenta filas por combinación de códigos: un
+# array denso de prod(len(tabla) + 1) enteros (~15 mil con config_nse.json),
+# independiente de la cantidad de filas. Se combina entre bloques/procesos
+# sumando y, a diferencia de un t-digest o KLL, no pierde información: la
+# normalización min–max sale de las categorías observadas y los percentiles
+# son exactos.
+
+class BocetoNSE:
+    """
+    Conteos de filas por combinación de códigos de los componentes del NSE
+    (combinable). Es exacto, no una aproximación: los percentiles que salen
+    de acá son los mismos que con todas las filas en memoria.
+    """
+
+    __slots__ = ("tamanos", "conteos")
+
+    def __init__(self, tamanos, conteos=None):
+        self.tamanos = tuple(tamanos)
+        self.conteos = np.zeros(int(np.prod(self.tamanos)), dtype=np.int64) if conteos is None else conteos
+
+    @classmethod
+    def vacio(cls, config):
+        # +1 por componente: el código -1 (sin mapeo/NaN) ocupa la posición 0
+        return cls(len(config.categorias(componente)) + 1 for componente in COMPONENTES_NSE)
+
+    @property
+    def total(self):
+        return int(self.conteos.sum())
+
+    def claves(self, df, config, col):
+        """Índice de la combinación de códigos de cada fila de `df`."""
+        indices = []
+        for componente, (nombre_columna, _) in COMPONENTES_NSE.items():
+            indices.append(config.codificar(componente, df[col[nombre_columna]]).astype(np.int64) + 1)
+        return np.ravel_multi_index(indices, self.tamanos)
+
+    def agregar_bloque(self, df, config, col):
+        self.conteos += np.bincount(self.claves(df, config, col), minlength=len(self.conteos))
+        return self
+
+    def combinar(self, otro):
+        return BocetoNSE(self.tamanos, self.conteos + otro.conteos)
+
+    def percentiles_por_clave(self, config):
+        """Percentil promedio 0–100 de cada combinación, como en main() sobre la encuesta completa."""
+        codigos = [indice - 1 for indice in np.unravel_index(np.arange(len(self.conteos)), self.tamanos)]
+        por_componente = self.conteos.reshape(self.tamanos)
+
+        matriz = np.empty((len(self.conteos), len(config.ponderados)))
+        for j, componente in enumerate(config.ponderados):
+            eje = list(COMPONENTES_NSE).index(componente)
+            otros_ejes = tuple(e for e in range(len(self.tamanos)) if e != eje)
+            observados = np.flatnonzero(por_componente.sum(axis=otros_ejes)) - 1
+            matriz[:, j] = puntajes_normalizados_por_categoria(observados, config, componente)[codigos[eje]]
+
+        compuesto = _combinar_matriz(matriz, config)
+        presentes = (self.conteos > 0) & ~np.isnan(compuesto)
+        valores, inverso = np.unique(compuesto[presentes], return_inverse=True)
+        conteos = np.bincount(inverso, weights=self.conteos[presentes]).astype(np.int64)
+        distribucion = DistribucionNSE(valores, conteos, rangos=None, firma=None)
+
+        percentil = np.full(len(self.conteos), np.nan)
+        percentil[presentes] = distribucion.percentiles(compuesto[presentes])
+        return percentil
+
+
+def boceto_de_bloque(df, config, col):
+    return BocetoNSE.vacio(config).agregar_bloque(df, config, col)
+
+
+def main_por_bloques(ruta_entrada=ENCUESTA_LIMPIA, ruta_salida=ENCUESTA_CON_NSE,
+                     tamano_bloque=100_000, procesos=None):
+    """
+    NSE en dos pasadas por bloques, con memoria acotada:
+      1) lee solo las cuatro columnas fuente y arma el boceto (en paralelo si
+         `procesos` > 1, combinando los bocetos de cada bloque);
+      2) relee por bloques, asigna percentil y nivel y escribe `ruta_salida`.
+    Devuelve {"filas": ...}.
+    """
+    config = cargar_configuracion_compilada(CONFIG_PUNTAJE)
+    encabezado = almacenamiento.leer_encabezado(ruta_entrada)
+    col = {nombre: columna_por_prefijo(encabezado, prefijo) for nombre, prefijo in PREFIJOS_COLUMNAS.items()}
+    fuentes = list(dict.fromkeys(col.values()))
+
+    # Pasada 1: boceto
+    boceto = BocetoNSE.vacio(config)
+    bloques = almacenamiento.leer_intermedio_por_bloques(ruta_entrada, tamano_bloque, columnas=fuentes)
+    with medir("nse.boceto") as medida:
+        if procesos and procesos > 1:
+            with ProcessPoolExecutor(max_workers=procesos) as executor:
+                funcion = partial(boceto_de_bloque, config=config, col=col)
+                for parcial in mapear_en_orden(executor, funcion, bloques, max_pendientes=2 * procesos):
+                    boceto = boceto.combinar(parcial)
+        else:
+            for bloque in bloques:
+                boceto.agregar_bloque(bloque, config, col)
+        medida["filas_entrada"] = boceto.total
+    with medir("nse.percentiles", filas_entrada=boceto.total):
+        percentil_por_clave = boceto.percentiles_por_clave(config)
+
+    # Pasada 2: asignación (guardar_intermedio_por_bloques escribe a un temporal,
+    # porque entrada y salida suelen ser el mismo archivo)
+    def con_nse(bloques):
+        for bloque in bloques:
+            _asignar_nse(bloque, percentil_por_clave[boceto.claves(bloque, config, col)])
+            yield bloque
+
+    bloques = almacenamiento.leer_intermedio_por_bloques(ruta_entrada, tamano_bloque)
+    with medir("nse.asignacion") as medida:
+        filas = almacenamiento.guardar_intermedio_por_bloques(con_nse(bloques), ruta_salida)
+        medida["filas_salida"] = filas
 
-    # Puntajes crudos desde mapeos  
-    puntaje_barrio_crudo = puntuar_serie_desde_mapeo(df[COLUMNA_BARRIO],     config["puntajes_barrio"])
-    puntaje_educacion_crudo = puntuar_serie_desde_mapeo(df[COLUMNA_EDUCACION], config["puntajes_educacion"])
-    puntaje_trabajo_crudo = puntuar_serie_desde_mapeo(df[COLUMNA_TRABAJO],   config["puntajes_trabajo"])
-    puntaje_ocupacion_crudo = puntuar_serie_desde_mapeo(df[COLUMNA_OCUPACION], config["puntajes_ocupacion"])
+    return {"filas": filas}
 
-    # Normalización 0-1 por componente
-    comp = {
-        "barrio":    normalizar_minmax_0_1(puntaje_barrio_crudo),
-        "educacion": normalizar_minmax_0_1(puntaje_educacion_crudo),
-        "trabajo":   normalizar_minmax_0_1(puntaje_trabajo_crudo),
-        "ocupacion": normalizar_minmax_0_1(puntaje_ocupacion_crudo),
-    }
 
-    # Pesos (del JSON, sin fallback)
-    pesos = config["pesos"]
+def main(df=None, guardar=True, ruta_entrada=ENCUESTA_LIMPIA, ruta_salida=ENCUESTA_CON_NSE):
+    # Si no recibe el DataFrame limpio (en memoria) lo lee de `ruta_entrada`.
+    # Agrega las columnas de NSE sobre el mismo df y lo devuelve.
+    if df is None:
+        df = almacenamiento.leer_intermedio(ruta_entrada)
+    config = cargar_configuracion_compilada(CONFIG_PUNTAJE)
+    col = {nombre: columna_por_prefijo(df.columns, prefijo) for nombre, prefijo in PREFIJOS_COLUMNAS.items()}
+    advertir_categorias_sin_mapeo(df, config, col)
 
-    # Puntaje compuesto 0-1 y percentil 0-100
-    puntaje_compuesto_0_1 = combinar_componentes_normalizados(comp, pesos, index=df.index)
-    percentil = puntaje_compuesto_0_1.rank(method="average", pct=True) * 100.0
-    df[COLUMNA_PERCENTIL_NSE] = pd.to_numeric(round(percentil))
+    # Puntaje compuesto 0-1 (pesos del JSON, sin fallback) y percentil 0-100
+    with medir("nse.puntaje", filas_entrada=len(df)):
+        puntaje_compuesto_0_1 = puntaje_compuesto_vectorizado(df, config, col)
+    with medir("nse.percentiles", filas_entrada=len(df)):
+        percentil = percentil_promedio(puntaje_compuesto_0_1)
 
-    # Categoría NSE y percentil
-    df[COLUMNA_SALIDA_NSE] = percentil.map(categorizar_por_percentil)
+    # Percentil redondeado y categoría NSE según el percentil
+    _asignar_nse(df, percentil)
 
 
     # Guardar
-    df.to_csv(ENCUESTA_CON_NSE, index=False)
+    if guardar:
+        almacenamiento.guardar_intermedio(df, ruta_salida)
+    return df
 
 if __name__ == "__main__":
     main()
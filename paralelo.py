@@ -0,0 +1,21 @@
+# paralelo.py
+"""
+Utilidades para repartir trabajo en un ProcessPoolExecutor sin cargar toda la
+entrada en memoria (executor.map consume el iterable completo de entrada).
+"""
+
+from collections import deque
+
+
+def mapear_en_orden(executor, funcion, elementos, max_pendientes: int):
+    """
+    Como executor.map(funcion, elementos), pero con a lo sumo `max_pendientes`
+    tareas en vuelo. Devuelve los resultados en el orden de `elementos`.
+    """
+    pendientes = deque()
+    for elemento in elementos:
+        pendientes.append(executor.submit(funcion, elemento))
+        if len(pendientes) >= max_pendientes:
+            yield pendientes.popleft().result()
+    while pendientes:
+        yield pendientes.popleft().result()
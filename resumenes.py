@@ -0,0 +1,108 @@
+# resumenes.py
+"""
+Tablas resumen (chicas) de las que se dibujan las figuras de hipotesis_1 e
+hipotesis_2, en lugar de pasarles el DataFrame por respondente.
+
+Cada módulo de hipótesis cuenta filas por combinación de sus columnas en una
+sola pasada (conteos()) y de ahí saca las tablas de cada figura sumando
+(marginal()). Con los conteos alcanza para los porcentajes, y también para
+medianas, intervalos y cajas (las respuestas son discretas: Likert 1–5 y
+percentil NSE redondeado), sin volver a los datos. Las capas que dibujan
+puntos (strip, violín) usan una muestra por cuotas de a lo sumo
+MAX_PUNTOS_MUESTRA filas por grupo.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Tope de puntos por grupo en las capas strip/violín
+MAX_PUNTOS_MUESTRA = 2000
+
+COLUMNA_CONTEO = "n"
+
+
+def conteos(df: pd.DataFrame, columnas) -> pd.DataFrame:
+    """Filas de `df` por combinación de `columnas` (NaN incluido), en formato largo con columna 'n'."""
+    columnas = list(columnas)
+    return (
+        df.groupby(columnas, dropna=False, observed=True, sort=False)
+          .size()
+          .reset_index(name=COLUMNA_CONTEO)
+    )
+
+
+def marginal(tabla: pd.DataFrame, columnas) -> pd.DataFrame:
+    """Suma los conteos de `tabla` sobre las columnas que no están en `columnas`."""
+    columnas = list(columnas)
+    return (
+        tabla.groupby(columnas, dropna=False, observed=True, sort=False)[COLUMNA_CONTEO]
+             .sum()
+             .reset_index()
+    )
+
+
+def _ordenar(valores, conteos):
+    orden = np.argsort(valores, kind="stable")
+    return np.asarray(valores, dtype=float)[orden], np.asarray(conteos, dtype=np.int64)[orden]
+
+
+def cuantil_desde_conteos(valores, conteos, q: float) -> float:
+    """Como np.percentile(datos, 100 * q) (interpolación lineal) con datos dados por valor y conteo."""
+    valores, conteos = _ordenar(valores, conteos)
+    acumulados = np.cumsum(conteos)
+    posicion = (acumulados[-1] - 1) * q
+    abajo = int(np.floor(posicion))
+    # Valor de la posición k (0-based) de los datos expandidos
+    valor_abajo = valores[np.searchsorted(acumulados, abajo, side="right")]
+    valor_arriba = valores[np.searchsorted(acumulados, min(abajo + 1, acumulados[-1] - 1), side="right")]
+    return float(valor_abajo + (posicion - abajo) * (valor_arriba - valor_abajo))
+
+
+def mediana_desde_conteos(valores, conteos) -> float:
+    return cuantil_desde_conteos(valores, conteos, 0.5)
+
+
+def estadisticas_caja(valores, conteos, etiqueta=None, whis: float = 1.5) -> dict:
+    """
+    Estadísticas de un boxplot (formato de Axes.bxp, como matplotlib.cbook.boxplot_stats)
+    a partir de valores y conteos. Los atípicos se listan una vez por valor distinto.
+    """
+    valores, conteos = _ordenar(valores, conteos)
+    q1, mediana, q3 = (cuantil_desde_conteos(valores, conteos, q) for q in (0.25, 0.5, 0.75))
+    rango = q3 - q1
+    # Bigotes: dato más extremo dentro de 1.5·IQR, pero sin meterse en la caja (como cbook)
+    bajo = valores[valores >= q1 - whis * rango]
+    alto = valores[valores <= q3 + whis * rango]
+    bigote_bajo = q1 if len(bajo) == 0 or bajo.min() > q1 else float(bajo.min())
+    bigote_alto = q3 if len(alto) == 0 or alto.max() < q3 else float(alto.max())
+    return {
+        "label": etiqueta,
+        "mean": float(np.average(valores, weights=conteos)),
+        "med": mediana,
+        "q1": q1,
+        "q3": q3,
+        "iqr": rango,
+        "whislo": bigote_bajo,
+        "whishi": bigote_alto,
+        "fliers": valores[(valores < bigote_bajo) | (valores > bigote_alto)],
+        "n": int(conteos.sum()),
+    }
+
+
+def muestra_por_cuotas(tabla: pd.DataFrame, grupo: str, valor: str,
+                       maximo: int = MAX_PUNTOS_MUESTRA) -> pd.DataFrame:
+    """
+    Expande `tabla` (grupo, valor, n) a filas individuales con a lo sumo ~`maximo`
+    por grupo, manteniendo la proporción de cada valor (redondeando hacia arriba,
+    para que los valores raros sigan apareciendo). Si el grupo entra completo, se
+    expande tal cual. Determinística.
+    """
+    partes = []
+    for _, filas in tabla.groupby(grupo, sort=False, observed=True):
+        n = filas[COLUMNA_CONTEO].to_numpy()
+        factor = min(1.0, maximo / n.sum()) if n.sum() else 1.0
+        repeticiones = np.ceil(n * factor).astype(np.int64)
+        partes.append(filas[[grupo, valor]].loc[filas.index.repeat(repeticiones)])
+    if not partes:
+        return tabla[[grupo, valor]].iloc[:0]
+    return pd.concat(partes, ignore_index=True)
@@ -1,10 +1,24 @@
 # tabla_1.py
+import hashlib
+import os
+from itertools import combinations, zip_longest
+
+import numpy as np
 import pandas as pd
 
+from almacenamiento import ENCUESTA_LIMPIA, leer_intermedio_por_bloques
+from archivos import DIRECTORIO_CACHE, escritura_atomica, hash_archivo
+from columnas import columna, columna_por_prefijo
+from esquema import ORDEN_NSE, ORDEN_P8, codigos
+
 # --- Configuración básica ---
 ruta_csv = "Encuesta.csv"
-columna_genero = "1- Género"
-columna_edad = "2- Edad (años):"
+# Preguntas de género y edad (la columna se busca por número, ver columnas.py)
+pregunta_genero = 1
+pregunta_edad = 2
+
+orden_genero = ["Varón", "Mujer", "Otro"]
+orden_edad = ["1 a 30", "31 a 60", "61 en adelante"]
 
 def clasificar_genero(valor):
     # Devuelve 'Varón', 'Mujer' o 'Otro'
@@ -22,8 +36,28 @@ def clasificar_edad(edad):
         return "31 a 60"
     return "61 en adelante"
 
+# Versiones vectorizadas: devuelven el índice en `orden_genero` / `orden_edad`
+# de cada fila, con las mismas reglas que las funciones de arriba.
+
+def codigos_genero(serie):
+    valores = serie.to_numpy(dtype=object, na_value=None)
+    return np.select([valores == "Varon", valores == "Mujer"], [0, 1], default=2)
+
+def codigos_edad(serie):
+    # Mismos límites inclusive que clasificar_edad: lo que no cae en [1, 30] ni
+    # en [31, 60] (p. ej. 30.5, 0 o NaN) va a "61 en adelante"
+    edad = pd.to_numeric(serie, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    codigos = np.full(len(edad), 2)
+    codigos[(edad >= 1) & (edad <= 30)] = 0
+    codigos[(edad >= 31) & (edad <= 60)] = 1
+    return codigos
+
 def tabla_totales_y_porcentajes(serie_categorizada, orden, nombre_variable):
     conteos = serie_categorizada.value_counts().reindex(orden).fillna(0).astype(int)
+    return tabla_desde_conteos(conteos, nombre_variable)
+
+def tabla_desde_conteos(conteos, nombre_variable):
+    # `conteos`: Serie de enteros indexada por categoría, en el orden de la tabla
     porcentajes = (conteos / conteos.sum() * 100).round(2)
     porcentajes_str = porcentajes.map(lambda v: f"{v:.2f}%")  
 
@@ -34,20 +68,218 @@ def tabla_totales_y_porcentajes(serie_categorizada, orden, nombre_variable):
     })
     return tabla.set_index(nombre_variable)
 
-def main():
-    # Leer CSV (se asume codificación utf-8 y datos válidos)
-    df = pd.read_csv(ruta_csv)
+# --- Tablas de frecuencia de una o varias variables ---
+# Cada variable se codifica a enteros 0..k-1 (k = sin dato) y se cuentan todas
+# las combinaciones con un solo np.bincount sobre el código combinado. De ese
+# array conjunto sale cualquier tabla (de una variable o cruzada) sumando sobre
+# las demás, sin volver a los datos. El conteo se guarda en disco con el hash
+# de los archivos como clave, así que pedir más tablas no cuesta otra lectura;
+# y un conteo guardado sirve también para cualquier subconjunto de sus variables.
 
-    # Categorización de variables
-    genero_cat = df[columna_genero].apply(clasificar_genero)
-    edad_cat = df[columna_edad].apply(clasificar_edad)
+FALTANTE = "Sin dato"
+TAMANO_BLOQUE = 100_000
+DIRECTORIO_CONTEOS = os.path.join(DIRECTORIO_CACHE, "tablas")
 
-    # Tablas
-    orden_genero = ["Varón", "Mujer", "Otro"]
-    orden_edad = ["1 a 30", "31 a 60", "61 en adelante"]
+# Subir cuando cambie la codificación de alguna variable (invalida los conteos guardados)
+VERSION_CONTEOS = 1
+
+def codigos_exposicion(serie):
+    # Misma lectura de la P8 que hipotesis_2: 'Si'/'No' sin importar espacios ni mayúsculas
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        por_categoria = np.append(codigos_exposicion(pd.Series(serie.cat.categories)), -1)
+        return por_categoria[serie.cat.codes.to_numpy()]
+    return codigos(serie.astype(str).str.strip().str.lower(), [c.lower() for c in ORDEN_P8])
+
+# Variable → (pregunta o prefijo de la columna, archivo, categorías en orden, nombre en la tabla, codificador).
+# Género y edad salen de la encuesta cruda (limpieza no las conserva); NSE y
+# exposición, del intermedio. Los dos archivos tienen las mismas filas en el mismo orden.
+VARIABLES = {
+    "genero":     (pregunta_genero, ruta_csv, orden_genero, "Género", codigos_genero),
+    "edad":       (pregunta_edad, ruta_csv, orden_edad, "Edad", codigos_edad),
+    "nse":        ("nivel socioeconómico", ENCUESTA_LIMPIA, ORDEN_NSE, "Nivel socioeconómico", None),
+    "exposicion": (8, ENCUESTA_LIMPIA, ORDEN_P8, "Exposición", codigos_exposicion),
+}
+
+def _validar_variables(variables):
+    variables = tuple(variables)
+    if not variables:
+        raise ValueError("Hace falta al menos una variable")
+    for variable in variables:
+        if variable not in VARIABLES:
+            raise ValueError(f"Variable desconocida '{variable}' (hay: {', '.join(VARIABLES)})")
+    return variables
+
+class ConteoConjunto:
+    """Filas por combinación de `variables`: array k1 × k2 × ... (la última posición de cada eje es FALTANTE)."""
+
+    __slots__ = ("variables", "conteos")
+
+    def __init__(self, variables, conteos=None):
+        self.variables = _validar_variables(variables)
+        forma = tuple(len(VARIABLES[v][2]) + 1 for v in self.variables)
+        if conteos is None:
+            self.conteos = np.zeros(forma, dtype=np.int64)
+        else:
+            self.conteos = np.asarray(conteos, dtype=np.int64).reshape(forma)
+
+    def agregar_bloque(self, df):
+        """Suma las filas de `df`, que tiene que traer las columnas de las variables."""
+        por_variable = []
+        for variable, tamano in zip(self.variables, self.conteos.shape):
+            prefijo, _, categorias, _, codificar = VARIABLES[variable]
+            serie = df[columna_por_prefijo(df.columns, prefijo)]
+            codigo = codificar(serie) if codificar else codigos(serie, categorias)
+            por_variable.append(np.where(codigo < 0, tamano - 1, codigo))
+        combinados = np.ravel_multi_index(por_variable, self.conteos.shape)
+        self.conteos += np.bincount(combinados, minlength=self.conteos.size).reshape(self.conteos.shape)
+        return self
+
+    def marginal(self, variables):
+        """Conteos sumados sobre las demás variables, con los ejes en el orden de `variables`."""
+        ejes = []
+        for variable in _validar_variables(variables):
+            if variable not in self.variables:
+                raise ValueError(f"'{variable}' no está en el conteo ({', '.join(self.variables)})")
+            ejes.append(self.variables.index(variable))
+        resto = tuple(i for i in range(self.conteos.ndim) if i not in ejes)
+        suma = self.conteos.sum(axis=resto)
+        quedan = sorted(ejes)
+        return suma.transpose([quedan.index(eje) for eje in ejes])
+
+    def tabla(self, *variables, faltantes=False):
+        """
+        Con una variable, la tabla Total/Porcentaje (como tabla_genero); con
+        varias, la tabla cruzada de conteos con la última variable en columnas.
+        Con `faltantes` se agrega la categoría FALTANTE.
+        """
+        conteos = self.marginal(variables)
+        categorias = [list(VARIABLES[v][2]) + [FALTANTE] for v in variables]
+        nombres = [VARIABLES[v][3] for v in variables]
+        if not faltantes:
+            conteos = conteos[tuple(slice(0, -1) for _ in variables)]
+            categorias = [c[:-1] for c in categorias]
 
-    tabla_genero = tabla_totales_y_porcentajes(genero_cat, orden_genero, "Género")
-    tabla_edad = tabla_totales_y_porcentajes(edad_cat, orden_edad, "Edad")
+        if len(variables) == 1:
+            return tabla_desde_conteos(pd.Series(conteos, index=categorias[0]), nombres[0])
+        if len(variables) == 2:
+            filas = pd.Index(categorias[0], name=nombres[0])
+        else:
+            filas = pd.MultiIndex.from_product(categorias[:-1], names=nombres[:-1])
+        columnas = pd.Index(categorias[-1], name=nombres[-1])
+        return pd.DataFrame(conteos.reshape(-1, conteos.shape[-1]), index=filas, columns=columnas)
+
+def _bloques_alineados(columnas_por_archivo, tamano_bloque):
+    # Lee los archivos a la par, de a `tamano_bloque` filas, y pega las columnas de cada uno
+    lectores = [leer_intermedio_por_bloques(ruta, tamano_bloque, cols) for ruta, cols in columnas_por_archivo.items()]
+    for partes in zip_longest(*lectores):
+        if any(parte is None for parte in partes) or len({len(parte) for parte in partes}) > 1:
+            raise ValueError(f"{', '.join(columnas_por_archivo)} no tienen la misma cantidad de filas")
+        yield pd.concat([parte.reset_index(drop=True) for parte in partes], axis=1)
+
+# clave → (ConteoConjunto, {archivo: hash} de los archivos que leyó)
+_CONTEOS = {}
+
+def _en_orden(variables):
+    # Las variables en el orden de VARIABLES: así se guardan los conteos
+    return tuple(v for v in VARIABLES if v in variables)
+
+def _rutas(variables):
+    return list(dict.fromkeys(VARIABLES[v][1] for v in variables))
+
+def _superconjuntos(variables):
+    # Conjuntos de variables de los mismos archivos que incluyen a `variables`,
+    # del más chico al más grande (no se hashea ningún archivo que no se pidió)
+    rutas = set(_rutas(variables))
+    resto = [v for v in VARIABLES if v not in variables and VARIABLES[v][1] in rutas]
+    for cantidad in range(len(resto) + 1):
+        for extra in combinations(resto, cantidad):
+            yield _en_orden(set(variables) | set(extra))
+
+def _clave_conteo(variables, firmas):
+    # Versión, variables y hash de sus archivos (`firmas`: {archivo: hash})
+    partes = [f"v{VERSION_CONTEOS}", ",".join(variables)]
+    partes += [f"{ruta}={firmas[ruta]}" for ruta in _rutas(variables)]
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+def _ruta_conteo(clave, directorio):
+    return os.path.join(directorio, f"conteos-{clave[:24]}.npy")
+
+def _conteo_en_memoria(variables, firmas):
+    # Un conteo ya hecho en este proceso que incluya a `variables` y haya leído
+    # los mismos archivos que ellas (los demás archivos no cambian su marginal)
+    for conteo, firmas_conteo in _CONTEOS.values():
+        if set(variables) <= set(conteo.variables) and all(firmas_conteo.get(r) == f for r, f in firmas.items()):
+            return conteo
+    return None
+
+def _conteo_en_disco(variables, firmas, directorio):
+    clave = _clave_conteo(variables, firmas)
+    ruta_cache = _ruta_conteo(clave, directorio)
+    if not os.path.exists(ruta_cache):
+        return None
+    try:
+        conteo = ConteoConjunto(variables, np.load(ruta_cache, allow_pickle=False))
+    except (OSError, ValueError):
+        return None  # cache corrupta: se vuelve a contar
+    _CONTEOS[clave] = (conteo, firmas)
+    return conteo
+
+def conteo_conjunto(variables=tuple(VARIABLES), tamano_bloque=TAMANO_BLOQUE, usar_cache=True,
+                    directorio=DIRECTORIO_CONTEOS):
+    """
+    ConteoConjunto de `variables` leyendo de cada archivo solo sus columnas, por
+    bloques. Se memoriza (en este proceso y en `directorio`) por variables y
+    hash de los archivos: mientras los datos no cambien, no se vuelven a leer.
+    Solo se hashean los archivos de `variables`. Un conteo de más variables se
+    reusa sumando sobre las que sobran: en este proceso, cualquiera (p. ej. el
+    de todas); en `directorio`, solo los de variables de esos mismos archivos.
+    """
+    variables = _validar_variables(variables)
+    firmas = {ruta: hash_archivo(ruta) for ruta in _rutas(variables)}
+    conteo = _conteo_en_memoria(variables, firmas) if usar_cache else None
+    if usar_cache and conteo is None:
+        for candidato in _superconjuntos(variables):
+            conteo = _conteo_en_disco(candidato, firmas, directorio)
+            if conteo is not None:
+                break
+
+    if conteo is None:
+        candidato = _en_orden(variables)
+        columnas_por_archivo = {}
+        for variable in candidato:
+            prefijo, ruta = VARIABLES[variable][:2]
+            columnas_por_archivo.setdefault(ruta, []).append(columna(prefijo, ruta))
+        conteo = ConteoConjunto(candidato)
+        for bloque in _bloques_alineados(columnas_por_archivo, tamano_bloque):
+            conteo.agregar_bloque(bloque)
+        clave = _clave_conteo(candidato, firmas)
+        with escritura_atomica(_ruta_conteo(clave, directorio)) as temporal, open(temporal, "wb") as file:
+            np.save(file, conteo.conteos, allow_pickle=False)
+        _CONTEOS[clave] = (conteo, firmas)
+
+    if conteo.variables == variables:
+        return conteo
+    return ConteoConjunto(variables, conteo.marginal(variables))
+
+def tabla_frecuencias(*variables, conteo=None, faltantes=False):
+    # Atajo: tabla de `variables` desde `conteo` o desde el conteo de todas las VARIABLES
+    if conteo is None:
+        conteo = conteo_conjunto()
+    return conteo.tabla(*variables, faltantes=faltantes)
+
+def main(df=None, tamano_bloque=None):
+    # Usa la encuesta cruda en memoria si el orquestador la pasa; si no, lee del
+    # CSV solo las columnas de género y edad (se asume codificación utf-8), de a
+    # `tamano_bloque` filas: la memoria no depende del tamaño del archivo. Los
+    # conteos salen de un ConteoConjunto (una sola pasada, cacheado por hash).
+    if df is not None:
+        conteo = ConteoConjunto(("genero", "edad")).agregar_bloque(df)
+    else:
+        conteo = conteo_conjunto(("genero", "edad"), tamano_bloque or TAMANO_BLOQUE)
+
+    # Tablas
+    tabla_genero = conteo.tabla("genero")
+    tabla_edad = conteo.tabla("edad")
 
     # Mostrar resultados
     print("\n=== Tabla por Género ===")
@@ -58,6 +290,7 @@ def main():
 
     tabla_genero.to_html("tabla_genero.html", index=True)
     tabla_edad.to_html("tabla_edad.html", index=True)
+    return tabla_genero, tabla_edad
 
 
 if __name__ == "__main__":